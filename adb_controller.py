@@ -2,11 +2,29 @@ import subprocess
 import shlex
 import time
 
-def run_adb_command(command):
-    """Executes an ADB command and returns the output."""
+from scripts.adb_wire import get_wire_client, run_wire_command, wire_backend_enabled
+from scripts.config import load_config
+
+configs = load_config()
+
+def run_adb_command(command, serial=None):
+    """Executes an ADB command (on device `serial` if given, else the only attached one) and returns the output."""
+    device_args = ['-s', serial] if serial else []
     try:
-        print(f"Executing: adb {command}")
-        result = subprocess.run(['adb'] + shlex.split(command), capture_output=True, text=True, check=True)
+        print(f"Executing: adb {' '.join(device_args + [command])}")
+        if wire_backend_enabled(configs):
+            wire_result = run_wire_command(get_wire_client(configs), serial, shlex.split(command))
+            if wire_result is not None:
+                stdout, stderr, exit_code = wire_result
+                if stdout:
+                    print(f"Output: {stdout.strip()}")
+                if stderr:
+                    print(f"Error: {stderr.strip()}")
+                if exit_code != 0:
+                    print(f"Error executing command: adb {command} returned exit code {exit_code}")
+                    return None
+                return stdout.strip()
+        result = subprocess.run(['adb'] + device_args + shlex.split(command), capture_output=True, text=True, check=True)
         if result.stdout:
             print(f"Output: {result.stdout.strip()}")
         if result.stderr:
@@ -1,18 +1,19 @@
 import sys
 from adb_controller import run_adb_command
 
-def is_package_installed(package_name):
+def is_package_installed(package_name, serial=None):
     """
     Check if a package is installed on the connected device/emulator.
     
     Args:
         package_name (str): The package name to check
+        serial (str): Device serial to check; defaults to the only attached device
         
     Returns:
         bool: True if package is installed, False otherwise
     """
     print(f"Checking if package '{package_name}' is installed...")
-    result = run_adb_command(f"shell pm list packages | grep {package_name}")
+    result = run_adb_command(f"shell pm list packages | grep {package_name}", serial)
     
     if result and package_name in result:
         print(f"Package '{package_name}' is installed")
@@ -21,17 +22,18 @@ def is_package_installed(package_name):
         print(f"Package '{package_name}' is not installed")
         return False
 
-def get_package_version(package_name):
+def get_package_version(package_name, serial=None):
     """
     Get the version of an installed package.
     
     Args:
         package_name (str): The package name to check
+        serial (str): Device serial to check; defaults to the only attached device
         
     Returns:
         str: Version string if found, None otherwise
     """
-    result = run_adb_command(f"shell dumpsys package {package_name} | grep versionName")
+    result = run_adb_command(f"shell dumpsys package {package_name} | grep versionName", serial)
     if result:
         try:
             version = result.split("versionName=")[1].strip()
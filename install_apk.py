@@ -1,13 +1,15 @@
 import os
+import shlex
 import sys
 from adb_controller import run_adb_command
 
-def install_apk(apk_path):
+def install_apk(apk_path, serial=None):
     """
     Install an APK file on the connected device/emulator.
     
     Args:
         apk_path (str): Path to the APK file
+        serial (str): Device serial to install on; defaults to the only attached device
         
     Returns:
         bool: True if installation was successful, False otherwise
@@ -17,7 +19,7 @@ def install_apk(apk_path):
         return False
         
     print(f"Installing APK: {apk_path}")
-    result = run_adb_command(f"install -r {apk_path}")
+    result = run_adb_command(f"install -r {shlex.quote(apk_path)}", serial)
     
     if result and "Success" in result:
         print("APK installed successfully!")
@@ -0,0 +1,149 @@
+import queue
+import subprocess
+import threading
+import time
+import uuid
+
+from .utils import print_with_color
+
+
+class AdbShellSession:
+    """
+    Keeps one long-lived `adb shell` process per device and multiplexes commands over its stdin/stdout.
+    Every command is framed with a unique sentinel that carries the exit code, so stdout, stderr and the
+    status of each command can be recovered without spawning a new adb client per call.
+    """
+
+    def __init__(self, device_id: str | None, timeout: float = 10.0):
+        self.device_id = device_id
+        self.timeout = timeout
+        self._proc = None
+        self._stdout_queue = queue.Queue()
+        self._stderr_queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._token = uuid.uuid4().hex[:12]
+        self._counter = 0
+        self._stderr_merged = False # True when the device has no shell_v2 and stderr arrives on stdout
+
+    def start(self) -> bool:
+        cmd = ["adb"]
+        if self.device_id:
+            cmd.extend(["-s", self.device_id])
+        cmd.extend(["shell", "-T"]) # No PTY: keeps output free of \r and echo
+        try:
+            self._proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, bufsize=0)
+        except FileNotFoundError:
+            print_with_color("Error: 'adb' command not found. Shell session unavailable.", "red")
+            self._proc = None
+            return False
+        except Exception as e:
+            print_with_color(f"Failed to start persistent adb shell session: {e}", "red")
+            self._proc = None
+            return False
+
+        for stream, target in ((self._proc.stdout, self._stdout_queue), (self._proc.stderr, self._stderr_queue)):
+            threading.Thread(target=self._pump, args=(stream, target), daemon=True).start()
+
+        # Round-trip a no-op so a session that cannot reach the device is detected up front.
+        if self.run("true") is None:
+            self.close()
+            return False
+        return True
+
+    @staticmethod
+    def _pump(stream, target):
+        """Reader thread: forwards decoded lines to a queue, then None once the stream closes."""
+        try:
+            for raw_line in iter(stream.readline, b""):
+                target.put(raw_line.decode("utf-8", errors="replace").rstrip("\r\n"))
+        except Exception:
+            pass
+        target.put(None)
+
+    def is_alive(self) -> bool:
+        return self._proc is not None and self._proc.poll() is None
+
+    def run(self, command: str, timeout: float | None = None):
+        """
+        Runs `command` in the session shell.
+        Returns (stdout, stderr, exit_code), or None if the session is dead or timed out (the session is then closed).
+        """
+        if not self.is_alive():
+            return None
+        timeout = self.timeout if timeout is None else timeout
+
+        with self._lock:
+            self._counter += 1
+            sentinel = f"__NAVMIND_{self._token}_{self._counter}__"
+            err_marker = sentinel + "_ERR"
+            # Subshell keeps `cd`/`exit` from leaking into the session; </dev/null stops the command from eating our stdin.
+            framed = f"( {command} ) </dev/null; __rc=$?; echo {err_marker} >&2; echo {sentinel}:$__rc\n"
+            try:
+                self._proc.stdin.write(framed.encode("utf-8"))
+                self._proc.stdin.flush()
+            except (BrokenPipeError, OSError, ValueError):
+                self.close()
+                return None
+
+            deadline = time.monotonic() + timeout
+            out_lines = []
+            exit_code = None
+            while exit_code is None:
+                line = self._next_line(self._stdout_queue, deadline)
+                if line is None:
+                    self.close()
+                    return None
+                if line == err_marker:
+                    self._stderr_merged = True
+                    continue
+                idx = line.find(sentinel + ":")
+                if idx == -1:
+                    out_lines.append(line)
+                    continue
+                if idx > 0: # Command output without a trailing newline
+                    out_lines.append(line[:idx])
+                try:
+                    exit_code = int(line[idx + len(sentinel) + 1:].strip())
+                except ValueError:
+                    exit_code = -1
+
+            err_lines = []
+            if not self._stderr_merged:
+                while True:
+                    line = self._next_line(self._stderr_queue, deadline)
+                    if line is None:
+                        self.close()
+                        return None
+                    if line == err_marker:
+                        break
+                    err_lines.append(line)
+
+        return "\n".join(out_lines), "\n".join(err_lines), exit_code
+
+    @staticmethod
+    def _next_line(source, deadline):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        try:
+            return source.get(timeout=remaining)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        proc, self._proc = self._proc, None
+        if proc is None:
+            return
+        try:
+            if proc.poll() is None:
+                try:
+                    proc.stdin.write(b"exit\n")
+                    proc.stdin.flush()
+                except Exception:
+                    pass
+                try:
+                    proc.wait(timeout=1)
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+        except Exception:
+            pass
@@ -0,0 +1,280 @@
+import os
+import posixpath
+import socket
+import stat
+import struct
+import time
+
+from .utils import print_with_color
+
+# Shell protocol v2 packet ids (see adb's SERVICES.TXT / shell_protocol.h)
+_SHELL_ID_STDOUT = 1
+_SHELL_ID_STDERR = 2
+_SHELL_ID_EXIT = 3
+
+_SYNC_DATA_MAX = 64 * 1024
+
+ADB_TIMEOUT_ERROR = "adb command timed out"
+
+
+class AdbWireError(Exception):
+    """Raised when the adb server rejects a request or the connection breaks mid-protocol."""
+
+
+class AdbWireClient:
+    """
+    Minimal client for the adb host protocol, spoken directly to the adb server over TCP (default 127.0.0.1:5037).
+    Covers host:devices, host:transport:<serial>, shell (v2 with exit codes, v1 fallback), exec: and sync: push/pull,
+    which is everything the agent needs without forking the `adb` binary per call.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 5037, timeout: float = 10.0):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+
+    # --- Low-level framing ---
+    def _connect(self, timeout=None):
+        """Connects to the server; `timeout` (default ADB_WIRE_TIMEOUT) bounds the connect and each read until changed."""
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout if timeout is None else timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock
+
+    @staticmethod
+    def _recv_exact(sock, n: int) -> bytes:
+        buf = bytearray()
+        while len(buf) < n:
+            chunk = sock.recv(n - len(buf))
+            if not chunk:
+                raise AdbWireError(f"Connection closed by adb server (expected {n} bytes, got {len(buf)})")
+            buf.extend(chunk)
+        return bytes(buf)
+
+    @staticmethod
+    def _recv_all(sock) -> bytes:
+        chunks = []
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                return b"".join(chunks)
+            chunks.append(chunk)
+
+    def _send_request(self, sock, request: str):
+        payload = request.encode("utf-8")
+        sock.sendall(b"%04x" % len(payload) + payload)
+        status = self._recv_exact(sock, 4)
+        if status == b"OKAY":
+            return
+        if status == b"FAIL":
+            raise AdbWireError(self._recv_hex_payload(sock).decode("utf-8", errors="replace"))
+        raise AdbWireError(f"Unexpected adb server status {status!r} for request '{request}'")
+
+    def _recv_hex_payload(self, sock) -> bytes:
+        length = int(self._recv_exact(sock, 4), 16)
+        return self._recv_exact(sock, length)
+
+    def _open_service(self, serial: str | None, service: str, timeout=None):
+        """
+        Connects, switches to the device transport and opens `service`. Returns the connected socket.
+        ADB_WIRE_TIMEOUT only bounds the connect and handshake: the service's own output (a long `pm install` or
+        `am start -W`) is read with the caller's `timeout`, or without one.
+        """
+        sock = self._connect(timeout)
+        try:
+            self._send_request(sock, f"host:transport:{serial}" if serial else "host:transport-any")
+            self._send_request(sock, service)
+            sock.settimeout(timeout)
+        except Exception:
+            sock.close()
+            raise
+        return sock
+
+    # --- Host services ---
+    def devices(self) -> list:
+        """Returns [(serial, state), ...] as reported by host:devices."""
+        with self._connect() as sock:
+            self._send_request(sock, "host:devices")
+            listing = self._recv_hex_payload(sock).decode("utf-8", errors="replace")
+        devices = []
+        for line in listing.splitlines():
+            parts = line.split("\t")
+            if len(parts) >= 2:
+                devices.append((parts[0], parts[1]))
+        return devices
+
+    # --- Device services ---
+    def shell(self, serial: str | None, command: str, timeout=None):
+        """
+        Runs `command` via the shell service. Returns (stdout_bytes, stderr_bytes, exit_code).
+        Uses shell protocol v2 so the exit code and stderr are preserved; falls back to plain 'shell:' (exit code 0,
+        stderr merged into stdout) on devices that do not support it, mirroring the adb binary.
+        """
+        try:
+            sock = self._open_service(serial, f"shell,v2,raw:{command}", timeout)
+        except AdbWireError:
+            with self._open_service(serial, f"shell:{command}", timeout) as sock_v1:
+                return self._recv_all(sock_v1), b"", 0
+
+        stdout, stderr, exit_code = bytearray(), bytearray(), None
+        with sock:
+            while exit_code is None:
+                header = sock.recv(5)
+                if not header:
+                    break
+                if len(header) < 5:
+                    header += self._recv_exact(sock, 5 - len(header))
+                packet_id, length = header[0], struct.unpack("<I", header[1:5])[0]
+                data = self._recv_exact(sock, length) if length else b""
+                if packet_id == _SHELL_ID_STDOUT:
+                    stdout.extend(data)
+                elif packet_id == _SHELL_ID_STDERR:
+                    stderr.extend(data)
+                elif packet_id == _SHELL_ID_EXIT:
+                    exit_code = data[0] if data else 0
+        return bytes(stdout), bytes(stderr), exit_code if exit_code is not None else -1
+
+    def exec_out(self, serial: str | None, command: str, timeout=None) -> bytes:
+        """Runs `command` via the raw exec: service and returns its unmodified stdout (binary-safe, no PTY)."""
+        with self._open_service(serial, f"exec:{command}", timeout) as sock:
+            return self._recv_all(sock)
+
+    # --- Sync service ---
+    @staticmethod
+    def _sync_send(sock, command: bytes, payload: bytes = b""):
+        sock.sendall(command + struct.pack("<I", len(payload)) + payload)
+
+    def _sync_read_header(self, sock):
+        header = self._recv_exact(sock, 8)
+        return header[:4], struct.unpack("<I", header[4:])[0]
+
+    def pull(self, serial: str | None, remote_path: str, local_path: str) -> int:
+        """Copies a device file to `local_path`. Returns the number of bytes written."""
+        total = 0
+        with self._open_service(serial, "sync:") as sock:
+            self._sync_send(sock, b"RECV", remote_path.encode("utf-8"))
+            try:
+                with open(local_path, "wb") as f_out:
+                    while True:
+                        kind, length = self._sync_read_header(sock)
+                        if kind == b"DATA":
+                            f_out.write(self._recv_exact(sock, length))
+                            total += length
+                        elif kind == b"DONE":
+                            break
+                        elif kind == b"FAIL":
+                            raise AdbWireError(f"pull {remote_path}: {self._recv_exact(sock, length).decode('utf-8', errors='replace')}")
+                        else:
+                            raise AdbWireError(f"pull {remote_path}: unexpected sync response {kind!r}")
+            except Exception:
+                if os.path.exists(local_path):
+                    os.remove(local_path) # Do not leave a truncated file behind
+                raise
+            self._sync_send(sock, b"QUIT")
+        return total
+
+    def push(self, serial: str | None, local_path: str, remote_path: str, mode: int = 0o644) -> int:
+        """Copies a host file to `remote_path` on the device. Returns the number of bytes sent."""
+        total = 0
+        with self._open_service(serial, "sync:") as sock:
+            self._sync_send(sock, b"SEND", f"{remote_path},{stat.S_IFREG | mode}".encode("utf-8"))
+            with open(local_path, "rb") as f_in:
+                while True:
+                    chunk = f_in.read(_SYNC_DATA_MAX)
+                    if not chunk:
+                        break
+                    self._sync_send(sock, b"DATA", chunk)
+                    total += len(chunk)
+            sock.sendall(b"DONE" + struct.pack("<I", int(time.time())))
+            kind, length = self._sync_read_header(sock)
+            if kind == b"FAIL":
+                raise AdbWireError(f"push {remote_path}: {self._recv_exact(sock, length).decode('utf-8', errors='replace')}")
+            if kind != b"OKAY":
+                raise AdbWireError(f"push {remote_path}: unexpected sync response {kind!r}")
+            self._sync_send(sock, b"QUIT")
+        return total
+
+
+_wire_clients = {}
+
+def get_wire_client(configs) -> AdbWireClient:
+    """Returns a shared AdbWireClient for the server address configured via ADB_SERVER_HOST / ADB_SERVER_PORT."""
+    host = str(configs.get("ADB_SERVER_HOST", "127.0.0.1"))
+    try:
+        port = int(configs.get("ADB_SERVER_PORT", 5037))
+    except ValueError:
+        port = 5037
+    try:
+        timeout = float(configs.get("ADB_WIRE_TIMEOUT", 10))
+    except ValueError:
+        timeout = 10.0
+    key = (host, port, timeout)
+    if key not in _wire_clients:
+        _wire_clients[key] = AdbWireClient(host, port, timeout)
+    return _wire_clients[key]
+
+def wire_backend_enabled(configs) -> bool:
+    return str(configs.get("ADB_BACKEND", "subprocess")).lower() == "wire"
+
+def run_wire_exec_out(client: AdbWireClient, device_id: str | None, command_args: list, timeout=None):
+    """
+    Binary-safe counterpart of run_wire_command for ['exec-out', ...] argument lists.
+    Returns (stdout_bytes, error_message_or_None), or None when the caller should fall back to the adb binary.
+    """
+    if len(command_args) < 2 or command_args[0] != "exec-out":
+        return None
+    try:
+        return client.exec_out(device_id, " ".join(command_args[1:]), timeout), None
+    except ConnectionRefusedError as e:
+        print_with_color(f"adb server not reachable at {client.host}:{client.port} ({e}). Falling back to adb binary.", "yellow")
+        return None
+    except socket.timeout:
+        return b"", ADB_TIMEOUT_ERROR
+    except (AdbWireError, OSError) as e:
+        return b"", str(e)
+
+def run_wire_command(client: AdbWireClient, device_id: str | None, command_args: list, timeout=None):
+    """
+    Translates an adb CLI argument list into wire-protocol calls.
+    Returns (stdout, stderr, exit_code) with text output, or None when the command has no wire equivalent (or the
+    server is unreachable) and the caller should fall back to the adb binary.
+    """
+    if not command_args:
+        return None
+    verb, rest = command_args[0], command_args[1:]
+    try:
+        if verb == "devices":
+            listing = "".join(f"{serial}\t{state}\n" for serial, state in client.devices())
+            return "List of devices attached\n" + listing, "", 0
+        if verb == "shell" and rest:
+            # adb joins shell arguments with spaces before handing them to the device shell.
+            stdout, stderr, exit_code = client.shell(device_id, " ".join(rest), timeout)
+            return stdout.decode("utf-8", errors="replace"), stderr.decode("utf-8", errors="replace"), exit_code
+        if verb == "exec-out" and rest:
+            return client.exec_out(device_id, " ".join(rest), timeout).decode("utf-8", errors="replace"), "", 0
+        if verb == "pull" and len(rest) == 2:
+            remote_path, local_path = rest
+            if os.path.isdir(local_path):
+                local_path = os.path.join(local_path, posixpath.basename(remote_path))
+            size = client.pull(device_id, remote_path, local_path)
+            return f"{remote_path}: 1 file pulled, {size} bytes", "", 0
+        if verb == "push" and len(rest) == 2:
+            local_path, remote_path = rest
+            if remote_path.endswith("/"):
+                remote_path = posixpath.join(remote_path, os.path.basename(local_path))
+            size = client.push(device_id, local_path, remote_path)
+            return f"{local_path}: 1 file pushed, {size} bytes", "", 0
+        if verb == "install" and rest and not rest[-1].startswith("-"):
+            local_apk, install_flags = rest[-1], [flag for flag in rest[:-1] if flag.startswith("-")]
+            remote_apk = f"/data/local/tmp/{os.path.basename(local_apk)}"
+            client.push(device_id, local_apk, remote_apk)
+            stdout, stderr, exit_code = client.shell(device_id, " ".join(["pm", "install", *install_flags, remote_apk]))
+            client.shell(device_id, f"rm -f {remote_apk}")
+            return stdout.decode("utf-8", errors="replace"), stderr.decode("utf-8", errors="replace"), exit_code
+    except ConnectionRefusedError as e:
+        print_with_color(f"adb server not reachable at {client.host}:{client.port} ({e}). Falling back to adb binary.", "yellow")
+        return None
+    except socket.timeout:
+        return "", ADB_TIMEOUT_ERROR, 1
+    except (AdbWireError, OSError) as e:
+        return "", str(e), 1
+    return None
@@ -0,0 +1,804 @@
+import datetime
+import json
+import os
+import shutil
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from . import prompts
+from .and_controller import extract_elements, HIERARCHY_UNAVAILABLE
+from .element_store import ElementTable
+from .ui_diff import diff_hierarchies
+from .screen_graph import ScreenGraph, screen_fingerprint, action_key
+from .ineffective_index import IneffectiveIndex
+from .trajectory_cache import TrajectoryCache, TrajectoryReplay, step_from_action
+from .foreground_watchdog import ForegroundWatchdog, DEFAULT_ALLOWED_PACKAGES
+from .model import parse_explore_rsp, parse_reflect_rsp, OpenAIModel, QwenModel, GeminiModel
+from .utils import draw_bbox_multi, print_with_color, screens_match
+
+# Config key holding the API key of each supported MODEL
+API_KEY_CONFIG = {"OpenAI": "OPENAI_API_KEY", "Qwen": "DASHSCOPE_API_KEY", "Gemini": "GEMINI_API_KEY"}
+
+def _wait_for_ui(controller, adaptive, fixed_delay, reason):
+    """Waits for the UI to settle after `reason`; SETTLE_MODE 'fixed' (or no readable signal) sleeps `fixed_delay`."""
+    if adaptive:
+        settle_time = controller.wait_for_settle()
+        if settle_time is not None:
+            print_with_color(f"UI settled {settle_time:.2f}s after {reason}.", "cyan")
+            return settle_time
+    time.sleep(fixed_delay)
+    return fixed_delay
+
+def _build_ui_documentation(elem_table, docs_dir, hierarchy_available):
+    """Collects the saved docs of the labeled elements into the <ui_document> section of the action prompt."""
+    if not hierarchy_available:
+        return "UI hierarchy unavailable for this screen (the dump timed out), so no elements are labeled. Prefer global actions such as swipe_screen, press_back or grid."
+    ui_documentation_str = ""
+    for idx, elem_uid in enumerate(elem_table.uids):
+        doc_file_name = f"{elem_uid.replace('/', '_').replace(':', '.')}.txt"
+        doc_file_path = os.path.join(docs_dir, doc_file_name)
+        if os.path.exists(doc_file_path):
+            try:
+                with open(doc_file_path, "r", encoding="utf-8") as f_doc:
+                    doc_content = f_doc.read().strip()
+                    ui_documentation_str += f"Element {idx + 1} (UID: {elem_uid}): {doc_content}\n"
+            except Exception as e:
+                print_with_color(f"Error reading doc file {doc_file_path}: {e}", "red")
+    return ui_documentation_str or "No documentation available for elements on this screen."
+
+def _build_action_prompt(agent_mode, ui_documentation_str, last_act, task_desc_for_prompt):
+    if agent_mode == "explore":
+        return prompts.app_explore_template \
+                      .replace("<ui_document>", ui_documentation_str) \
+                      .replace("<last_act>", last_act) \
+                      .replace("<exploration_directive>", task_desc_for_prompt)
+    # agent_mode == "task"
+    return prompts.task_template \
+                  .replace("<task_description>", task_desc_for_prompt) \
+                  .replace("<last_act>", last_act) \
+                  .replace("<ui_document>", ui_documentation_str)
+
+def apply_model_overrides(configs, model_choice=None, api_key=None):
+    """Applies a CLI/orchestrator model choice and API key on top of `configs`. Returns False if they conflict."""
+    if model_choice:
+        print_with_color(f"CLI Override: Model choice set to '{model_choice}'.", "yellow")
+        configs["MODEL"] = model_choice
+    if api_key:
+        final_model_choice = configs.get("MODEL")
+        if not final_model_choice:
+            print_with_color("Error: --api_key provided without a VLM model being specified (via --model_choice, env, or config.yaml).", "red")
+            return False
+        print_with_color(f"CLI Override: API key provided for model '{final_model_choice}'.", "yellow")
+        if final_model_choice in API_KEY_CONFIG:
+            configs[API_KEY_CONFIG[final_model_choice]] = api_key
+        else:
+            print_with_color(f"Warning: API key provided via CLI, but the model '{final_model_choice}' is unknown. Key not assigned.", "orange")
+    return True
+
+def build_model(configs):
+    """Creates the VLM client selected by MODEL in `configs`, or returns None (after printing why) if it cannot."""
+    model_name = configs.get("MODEL")
+    if not model_name:
+        print_with_color("Error: VLM Model (MODEL) not specified in config, environment variables, or via --model_choice.", "red")
+        return None
+    if model_name not in API_KEY_CONFIG:
+        print_with_color(f"Unsupported model: {model_name}. Cannot validate API key.", "red")
+        return None
+    if not configs.get(API_KEY_CONFIG[model_name]):
+        print_with_color(f"Error: API key for the selected model '{model_name}' is missing or empty.", "red")
+        print_with_color("Please set it via --api_key, environment variable, or in config.yaml.", "red")
+        return None
+
+    if model_name == "OpenAI":
+        return OpenAIModel(base_url=configs.get("OPENAI_API_BASE"),
+                           api_key=configs["OPENAI_API_KEY"], 
+                           model=configs.get("OPENAI_API_MODEL"),
+                           temperature=float(configs.get("TEMPERATURE", 0.0)),
+                           max_tokens=int(configs.get("MAX_TOKENS", 1024)))
+    if model_name == "Qwen":
+        return QwenModel(api_key=configs["DASHSCOPE_API_KEY"], 
+                         model=configs.get("QWEN_MODEL"))
+    return GeminiModel(api_key=configs["GEMINI_API_KEY"], 
+                       model_name=configs.get("GEMINI_MODEL_NAME"))
+
+
+class TaskResult:
+    """Outcome of one AgentSession.run_task call."""
+
+    def __init__(self, app_name, package_name, description):
+        self.app_name = app_name
+        self.package_name = package_name
+        self.description = description
+        self.status = "error" # "completed", "max_rounds", "aborted", "interrupted", "launch_failed" or "error"
+        self.mode = None # "task" or "explore" once the description is classified
+        self.rounds = 0
+        self.doc_count = 0
+        self.app_events = 0
+        self.task_dir = None
+        self.duration_s = 0.0
+
+    def to_dict(self):
+        return dict(vars(self))
+
+
+class AgentSession:
+    """
+    Runs the agent for any number of tasks back-to-back on one device. The configuration, controller (with its
+    shell session, device profile and capture pool) and VLM client are created once by the caller and reused by
+    every run_task call; close() releases the controller when the batch is done.
+    """
+
+    def __init__(self, configs, controller, model, root_dir="."):
+        self.configs = configs
+        self.controller = controller
+        self.model = model
+        self.root_dir = root_dir
+        self.reflection_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="reflection")
+
+    def close(self):
+        self.reflection_pool.shutdown(wait=False)
+        self.controller.restore_device_profile()
+        self.controller.close()
+
+    def _cleanup_task(self, package_name, screenshot_dir, xml_dir, log_dir, docs_dir):
+        """Closes the app, stops its logcat monitor and removes the task's captures once a run_task call ends."""
+        # The controller stays open for the next task; AgentSession.close releases it
+        controller = self.controller
+        print_with_color(f"Attempting to close application: {package_name}", "yellow")
+        if not controller.close_app(package_name):
+            print_with_color(f"Could not ensure application {package_name} is closed.", "orange")
+        else:
+            print_with_color(f"Application {package_name} close command sent.", "green")
+        controller.stop_logcat_monitor()
+
+        print_with_color("Starting selective file cleanup...", "magenta")
+        for label, directory in (("screenshot", screenshot_dir), ("XML", xml_dir)):
+            if os.path.isdir(directory):
+                try:
+                    shutil.rmtree(directory)
+                    print_with_color(f"Successfully removed {label} directory: {directory}", "magenta")
+                except Exception as e: print_with_color(f"Error removing {label} directory {directory}: {e}", "red")
+            else: print_with_color(f"{label.capitalize()} directory not found or not a directory, skipping cleanup: {directory}", "yellow")
+
+        if os.path.isdir(log_dir): print_with_color(f"Log directory retained: {log_dir}", "green")
+        if os.path.isdir(docs_dir): print_with_color(f"Documentation directory retained: {docs_dir}", "green")
+
+    def run_task(self, app_name, package_name, description):
+        """
+        Launches `package_name`, classifies `description` as a TASK or EXPLORE directive and runs the observe / act /
+        reflect loop until FINISH or the round limit. Output goes to <root_dir>/apps/<app_name>/. Returns a TaskResult.
+        """
+        configs, controller, mllm, reflection_pool = self.configs, self.controller, self.model, self.reflection_pool
+        device = controller.device
+        result = TaskResult(app_name, package_name, description)
+        task_start = time.time()
+
+        # --- Directory Setup ---
+        work_dir = os.path.join(self.root_dir, "apps")
+        app_dir = os.path.join(work_dir, app_name)
+
+        demo_timestamp = int(time.time())
+        demo_name = datetime.datetime.fromtimestamp(demo_timestamp).strftime("self_explore_%Y-%m-%d_%H-%M-%S")
+        task_dir = os.path.join(app_dir, "demos", demo_name)
+        suffix = 1
+        while os.path.exists(task_dir): # Back-to-back tasks can start within the same second
+            suffix += 1
+            task_dir = os.path.join(app_dir, "demos", f"{demo_name}_{suffix}")
+        result.task_dir = task_dir
+        screenshot_dir = os.path.join(task_dir, "screenshots")
+        xml_dir = os.path.join(task_dir, "xmls")
+        log_dir = os.path.join(task_dir, "logs")
+        docs_dir = os.path.join(app_dir, "auto_docs") 
+
+        os.makedirs(screenshot_dir, exist_ok=True)
+        os.makedirs(xml_dir, exist_ok=True)
+        os.makedirs(log_dir, exist_ok=True)
+        os.makedirs(docs_dir, exist_ok=True)
+
+        # Unlabeled captures are only needed on disk when explicitly requested; the labeled copies are always written.
+        raw_screenshot_dir = screenshot_dir if str(configs.get("SAVE_RAW_SCREENSHOTS", "false")).lower() == 'true' else None
+        save_labeled_screenshots = str(configs.get("SAVE_LABELED_SCREENSHOTS", "true")).lower() == 'true'
+        # Skip the reflection VLM call when the before/after hierarchies and screenshots show the action changed nothing.
+        reflection_fast_path = str(configs.get("REFLECTION_FAST_PATH", "false")).lower() == 'true'
+        try:
+            reflection_fast_path_threshold = float(configs.get("REFLECTION_FAST_PATH_THRESHOLD", 0.0))
+        except ValueError:
+            reflection_fast_path_threshold = 0.0
+
+        # Screens and transitions seen across runs of this app
+        screen_graph = ScreenGraph(os.path.join(app_dir, "screen_graph.json"))
+        # Elements found ineffective per screen, remembered across runs with a decaying hit count
+        try:
+            ineffective_index = IneffectiveIndex(os.path.join(app_dir, "ineffective_index.json"),
+                                                 half_life_hours=float(configs.get("INEFFECTIVE_HALF_LIFE_HOURS", 72)),
+                                                 min_hits=float(configs.get("INEFFECTIVE_MIN_HITS", 0.5)))
+        except ValueError:
+            ineffective_index = IneffectiveIndex(os.path.join(app_dir, "ineffective_index.json"))
+
+        log_explore_path = os.path.join(log_dir, "explore_log.txt")
+        log_reflect_path = os.path.join(log_dir, "reflect_log.txt")
+
+        # --- Launch Application ---
+        print_with_color(f"Launching application: {package_name}", "blue")
+        if not controller.launch_app(package_name):
+            print_with_color(f"Failed to launch application {package_name}. Please check the package name and device connectivity.", "red")
+            result.status = "launch_failed"
+            result.duration_s = round(time.time() - task_start, 3)
+            return result
+
+        app_load_delay_str = configs.get("APP_LOAD_DELAY_SECONDS", "5") # Get as string first
+        app_load_delay = 5 # Default
+        try:
+            app_load_delay = int(app_load_delay_str)
+        except ValueError:
+            print_with_color(f"Warning: Invalid APP_LOAD_DELAY_SECONDS value '{app_load_delay_str}'. Defaulting to 5 seconds.", "yellow")
+
+        if str(configs.get("LOGCAT_MONITOR", "true")).lower() == 'true':
+            controller.start_logcat_monitor(package_name)
+
+        # SETTLE_MODE 'adaptive' polls the device until the UI stops changing instead of sleeping the fixed delays
+        adaptive_settle = str(configs.get("SETTLE_MODE", "adaptive")).lower() == "adaptive"
+        if controller.last_launch_time_ms is not None:
+            # The launch itself was awaited (LAUNCH_MODE am/poll); record the start time for this APK
+            launch_record = {"timestamp": int(time.time()), "package": package_name, "device": device,
+                             "launch_state": controller.last_launch_state, "launch_time_ms": controller.last_launch_time_ms}
+            try:
+                with open(os.path.join(app_dir, "launch_metrics.jsonl"), "a", encoding="utf-8") as f_metrics:
+                    f_metrics.write(json.dumps(launch_record) + "\n")
+            except OSError as e:
+                print_with_color(f"Could not record launch metrics: {e}", "red")
+            if adaptive_settle:
+                _wait_for_ui(controller, adaptive_settle, 0, "app launch")
+        else:
+            if not adaptive_settle:
+                print_with_color(f"Waiting {app_load_delay} seconds for app to load...", "cyan")
+            _wait_for_ui(controller, adaptive_settle, app_load_delay, "app launch")
+
+        if controller.width == 0 or controller.height == 0:
+            print_with_color("Critical: Device screen resolution is 0x0 after controller initialization and app launch attempt. Agent cannot proceed.", "red")
+            self._cleanup_task(package_name, screenshot_dir, xml_dir, log_dir, docs_dir)
+            result.duration_s = round(time.time() - task_start, 3)
+            return result
+        else:
+            print_with_color(f"Screen size reported by controller: {controller.width}x{controller.height}", "green")
+
+        # --- Determine Agent Behavior Mode ---
+        agent_mode = "task" 
+        classification_prompt_text = prompts.description_classification_template.replace("<description_text>", description)
+        print_with_color("Classifying user description to determine agent mode (TASK or EXPLORE)...", "blue")
+        status_classify, rsp_classify = mllm.get_model_response(classification_prompt_text, [])
+
+        if not status_classify:
+            print_with_color(f"VLM call for description classification failed: {rsp_classify}. Defaulting to 'task' mode.", "red")
+        else:
+            cleaned_response = rsp_classify.strip().upper()
+            if cleaned_response == "TASK":
+                agent_mode = "task"
+            elif cleaned_response == "EXPLORE":
+                agent_mode = "explore"
+            else:
+                print_with_color(f"Unexpected response from VLM for description classification: '{rsp_classify}'. Defaulting to 'task' mode.", "yellow")
+                with open(log_explore_path, "a", encoding="utf-8") as f_log:
+                    f_log.write(f"Description Classification Attempt:\nPrompt: {classification_prompt_text}\nRaw VLM Response: {rsp_classify}\nCleaned Response: {cleaned_response}\nOutcome: Defaulted to 'task' mode.\n-----------------------------\n")
+        print_with_color(f"Agent mode set to: {agent_mode.upper()}", "green")
+        result.mode = agent_mode
+
+        manual_stop_requested = False
+        task_desc_for_prompt = description # Primary input from user
+
+        # Known-good trajectories for this (package, task) are replayed without VLM calls until the screen diverges
+        trajectory_cache, trajectory_replay = None, None
+        if agent_mode == "task" and str(configs.get("TRAJECTORY_CACHE", "true")).lower() == 'true':
+            trajectory_cache = TrajectoryCache(os.path.join(app_dir, "trajectory_cache.json"))
+            cached_steps = trajectory_cache.get(package_name, task_desc_for_prompt)
+            if cached_steps:
+                print_with_color(f"Found a cached trajectory of {len(cached_steps)} steps for this task. Replaying while screens match.", "cyan")
+                trajectory_replay = TrajectoryReplay(cached_steps)
+        recorded_steps = [] # Steps of this run, stored in the cache if the task finishes; None once a step cannot be fingerprinted
+
+        round_count = 0
+        doc_count = 0
+        task_complete = False
+        app_event_count = 0
+        crash_aborted = False
+        try:
+            last_act = "None"
+
+            max_rounds_config = configs.get("MAX_ROUNDS", "20")
+            max_rounds_for_loop = 20
+            try:
+                max_rounds_for_loop = int(max_rounds_config)
+            except ValueError:
+                 print_with_color(f"Warning: Invalid MAX_ROUNDS value '{max_rounds_config}'. Defaulting to 20 rounds.", "yellow")
+
+
+            if agent_mode == "explore":
+                max_rounds_config = configs.get("MAX_EXPLORE_ROUNDS", "50") # Default to 50 for explore
+                try:
+                    max_rounds_for_loop = int(max_rounds_config)
+                    if max_rounds_for_loop <= 0: # Ensure positive
+                        print_with_color(f"Warning: MAX_EXPLORE_ROUNDS ('{max_rounds_config}') must be positive. Defaulting to 50.", "yellow")
+                        max_rounds_for_loop = 50
+                except ValueError:
+                    print_with_color(f"Warning: Invalid MAX_EXPLORE_ROUNDS value '{max_rounds_config}'. Defaulting to 50 rounds.", "yellow")
+                    max_rounds_for_loop = 50
+                print_with_color(f"EXPLORE MODE: Agent will run for MAX_EXPLORE_ROUNDS ({max_rounds_for_loop}) or until manually stopped.", "magenta")
+            else: # agent_mode == "task"
+                max_rounds_config = configs.get("MAX_ROUNDS", "20") # Default to 20 for task
+                try:
+                    max_rounds_for_loop = int(max_rounds_config)
+                    if max_rounds_for_loop <= 0: # Ensure positive
+                        print_with_color(f"Warning: MAX_ROUNDS ('{max_rounds_config}') must be positive. Defaulting to 20.", "yellow")
+                        max_rounds_for_loop = 20
+                except ValueError:
+                    print_with_color(f"Warning: Invalid MAX_ROUNDS value '{max_rounds_config}'. Defaulting to 20 rounds.", "yellow")
+                    max_rounds_for_loop = 20
+            print_with_color(f"TASK MODE: Agent will run for MAX_ROUNDS ({max_rounds_for_loop}) or until task is marked FINISH.", "magenta")
+
+            def resolve_reflection(pending, navigate=True):
+                """
+                Waits for a submitted reflection request and applies its decision. Returns the decision.
+                With navigate=False a BACK decision is recorded but not pressed (the device has already been moved).
+                """
+                nonlocal doc_count
+                try:
+                    status_reflect, rsp_reflect = pending["future"].result()
+                except Exception as e:
+                    status_reflect, rsp_reflect = False, str(e)
+                interacted_element_uid, screen_fp = pending["uid"], pending["screen_fp"]
+                with open(log_reflect_path, "a", encoding="utf-8") as f_log:
+                    f_log.write(f"Round {pending['round']} ({agent_mode.upper()} Mode) Reflect Phase:\nPrompt: {pending['prompt']}\nResponse: {rsp_reflect}\n-----------------------------\n")
+
+                current_reflection_decision = "ERROR" # Default before parsing
+                if not status_reflect:
+                    print_with_color(f"VLM call for reflection failed: {rsp_reflect}.", "red")
+                else:
+                    reflect_res = parse_reflect_rsp(rsp_reflect)
+                    if reflect_res and reflect_res[0] != "ERROR":
+                        current_reflection_decision = reflect_res[0]
+                        documentation = reflect_res[2] 
+
+                        if current_reflection_decision == "INEFFECTIVE" or current_reflection_decision == "BACK" or current_reflection_decision == "CONTINUE":
+                            if interacted_element_uid and screen_fp:
+                                ineffective_index.mark(screen_fp, interacted_element_uid)
+                                ineffective_index.save()
+                            if current_reflection_decision == "BACK" and navigate:
+                                controller.back()
+                                _wait_for_ui(controller, adaptive_settle, pending["interval"], "reflection BACK")
+                        elif current_reflection_decision == "SUCCESS" and interacted_element_uid and screen_fp:
+                            ineffective_index.clear(screen_fp, interacted_element_uid)
+                            ineffective_index.save()
+
+                        if documentation and documentation.lower() != "n/a" and current_reflection_decision != "INEFFECTIVE" and interacted_element_uid:
+                            doc_path = os.path.join(docs_dir, f"{interacted_element_uid.replace('/', '_').replace(':', '.')}.txt")
+                            final_documentation = documentation
+                            if os.path.exists(doc_path) and str(configs.get("DOC_REFINE", "false")).lower() == 'true':
+                                try:
+                                    with open(doc_path, "r", encoding="utf-8") as f_doc: existing_doc = f_doc.read()
+                                    final_documentation = f"{existing_doc}\n---\nRefined ({datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}):\n{documentation}"
+                                    print_with_color(f"Refining documentation for {interacted_element_uid}", "cyan")
+                                except Exception as e:
+                                    print_with_color(f"Error reading existing doc for refinement: {e}", "red")
+                            try:
+                                with open(doc_path, "w", encoding="utf-8") as f_doc: f_doc.write(final_documentation)
+                                doc_count +=1
+                                print_with_color(f"Documentation generated/updated for element {interacted_element_uid}: {final_documentation[:100]}...", "magenta") # Print snippet
+                            except Exception as e:
+                                print_with_color(f"Error writing doc file {doc_path}: {e}", "red")
+                    else:
+                        print_with_color("Failed to parse reflection response.", "red")
+                return current_reflection_decision
+
+            # PIPELINE_ROUNDS: reflection of round N runs in the background while round N+1 is prepared from
+            # round N's post-action capture; its decision is applied before round N+1 acts.
+            pipeline_rounds = str(configs.get("PIPELINE_ROUNDS", "false")).lower() == 'true'
+            pending_reflection = None
+            carried_state = None
+
+            def settle_pending_reflection(reason):
+                """Resolves the previous round's reflection before `reason` moves the device, without its BACK."""
+                nonlocal pending_reflection
+                if pending_reflection is None:
+                    return
+                print_with_color(f"Resolving the previous round's reflection before {reason}; a BACK decision is not pressed.", "yellow")
+                if resolve_reflection(pending_reflection, navigate=False) in ("INEFFECTIVE", "BACK") and recorded_steps:
+                    recorded_steps.pop()
+                pending_reflection = None
+
+            # Brings the agent back into the target app without spending a VLM round when an action left it
+            allowed_packages = configs.get("FOREGROUND_ALLOWED_PACKAGES")
+            try:
+                foreground_max_backs = int(configs.get("FOREGROUND_MAX_BACKS", 2))
+            except ValueError:
+                foreground_max_backs = 2
+            foreground_watchdog = ForegroundWatchdog(
+                controller, package_name,
+                policy=str(configs.get("FOREGROUND_POLICY", "back")).lower(),
+                allowed_packages=[p.strip() for p in str(allowed_packages).split(",") if p.strip()] if allowed_packages else DEFAULT_ALLOWED_PACKAGES,
+                max_backs=foreground_max_backs)
+            try:
+                foreground_recovery_delay = int(configs.get("REQUEST_INTERVAL", 3))
+            except ValueError:
+                foreground_recovery_delay = 3
+            # CRASH_POLICY for crashes/ANRs reported by the logcat monitor: relaunch | abort | mark (let the VLM see it)
+            crash_policy = str(configs.get("CRASH_POLICY", "relaunch")).lower()
+            crash_log_path = os.path.join(log_dir, "crash_log.txt")
+
+            while round_count < max_rounds_for_loop:
+                if manual_stop_requested:
+                    print_with_color("Manual stop acknowledged. Exiting main loop.", "yellow")
+                    break
+                round_count += 1
+                print_with_color(f"Round {round_count} ({agent_mode.upper()} MODE)", "yellow")
+
+                app_events = controller.poll_app_events()
+                if app_events:
+                    app_event_count += len(app_events)
+                    with open(crash_log_path, "a", encoding="utf-8") as f_crash:
+                        for app_event in app_events:
+                            print_with_color(f"App event detected: {app_event.summary()}", "red")
+                            f_crash.write(f"Round {round_count} ({datetime.datetime.fromtimestamp(app_event.timestamp).strftime('%Y-%m-%d %H:%M:%S')}) "
+                                          f"{app_event.summary()}\nAfter action: {last_act}\n" + "\n".join(app_event.details) + "\n-----------------------------\n")
+                    last_act += f" (App {app_events[-1].kind.upper()} after this action: {app_events[-1].summary()})"
+                    if crash_policy == "abort":
+                        print_with_color(f"CRASH_POLICY is 'abort'. Ending the run; details in {crash_log_path}", "red")
+                        crash_aborted = True
+                        break
+                    if crash_policy == "relaunch":
+                        settle_pending_reflection("the crash relaunch")
+                        print_with_color(f"Relaunching {package_name} after {app_events[-1].kind}.", "yellow")
+                        controller.launch_app(package_name)
+                        carried_state = None
+                        _wait_for_ui(controller, adaptive_settle, foreground_recovery_delay, "crash relaunch")
+
+                if foreground_watchdog.check(before_recovery=lambda: settle_pending_reflection("foreground recovery")):
+                    carried_state = None # The recovery changed the screen
+                    _wait_for_ui(controller, adaptive_settle, foreground_recovery_delay, "foreground recovery")
+
+                if carried_state is not None:
+                    # The previous round's post-action capture is this round's observation
+                    state_before, carried_state = carried_state, None
+                else:
+                    state_before = controller.capture_state(f"{round_count}_before", raw_screenshot_dir, xml_dir)
+                screenshot_before, xml_path = state_before.screenshot, state_before.hierarchy
+                if screenshot_before is None or xml_path == "ERROR":
+                    print_with_color("Failed to get screenshot or XML. Ending current round.", "red")
+                    time.sleep(configs.get("REQUEST_INTERVAL", 3)) 
+                    if round_count >= max_rounds_for_loop : 
+                         print_with_color("Failed to get screenshot/XML on last round. Exiting loop.", "red")
+                         break
+                    continue 
+
+                hierarchy_available = xml_path != HIERARCHY_UNAVAILABLE
+                screen_fp = screen_fingerprint(xml_path) if hierarchy_available else None
+                if screen_fp:
+                    previous_visits = screen_graph.record_visit(screen_fp)
+                    if previous_visits:
+                        print_with_color(f"Known screen {screen_fp} (visited {previous_visits} times before, "
+                                         f"{len(screen_graph.transitions_from(screen_fp))} known transitions)", "cyan")
+                if hierarchy_available:
+                    elem_table = ElementTable.from_elements(extract_elements(xml_path))
+                    if screen_fp:
+                        elem_table = elem_table.without_uids(ineffective_index.ineffective_uids(screen_fp))
+                else:
+                    print_with_color("UI hierarchy unavailable this round. Proceeding with an unlabeled screenshot.", "yellow")
+                    elem_table = ElementTable()
+                screenshot_before_labeled_path = os.path.join(screenshot_dir, f"{round_count}_before_labeled.png")
+                labeled_before = draw_bbox_multi(screenshot_before, screenshot_before_labeled_path if save_labeled_screenshots else None, elem_table, dark_mode=str(configs.get("DARK_MODE", "false")).lower() == 'true')
+
+                ui_documentation_str = _build_ui_documentation(elem_table, docs_dir, hierarchy_available)
+                prompt_to_vlm = _build_action_prompt(agent_mode, ui_documentation_str, last_act, task_desc_for_prompt)
+
+                # Pipelined rounds: the previous round's reflection ran while this observation was prepared. Apply it now,
+                # before acting, and reconcile anything it invalidated.
+                if pending_reflection is not None:
+                    reflected_uid, reflected_fp = pending_reflection["uid"], pending_reflection["screen_fp"]
+                    reflection_decision = resolve_reflection(pending_reflection)
+                    pending_reflection = None
+                    if recorded_steps and reflection_decision in ("INEFFECTIVE", "BACK"):
+                        recorded_steps.pop()
+                    if reflection_decision == "BACK":
+                        # Reflection navigated away from the prepared screen; redo this round on the new one.
+                        print_with_color("Reflection chose BACK. Discarding the prepared observation and re-observing.", "yellow")
+                        round_count -= 1
+                        continue
+                    if (reflected_uid and screen_fp and reflected_uid in elem_table.uids
+                            and ineffective_index.is_ineffective(screen_fp, reflected_uid)):
+                        print_with_color(f"Reflection marked {reflected_uid} ineffective on this screen. Relabeling without it.", "yellow")
+                        elem_table = elem_table.without_uids({reflected_uid})
+                        labeled_before = draw_bbox_multi(screenshot_before, screenshot_before_labeled_path if save_labeled_screenshots else None, elem_table, dark_mode=str(configs.get("DARK_MODE", "false")).lower() == 'true')
+                        ui_documentation_str = _build_ui_documentation(elem_table, docs_dir, hierarchy_available)
+                        prompt_to_vlm = _build_action_prompt(agent_mode, ui_documentation_str, last_act, task_desc_for_prompt)
+
+                replayed_step = False
+                if trajectory_replay is not None:
+                    action_res = trajectory_replay.next_action(screen_fp, elem_table)
+                    if action_res is not None:
+                        replayed_step = True
+                        print_with_color(f"{action_res[-1]} (no VLM call)", "cyan")
+                    elif trajectory_replay.at_finish():
+                        print_with_color("Cached trajectory replayed up to its FINISH. Asking the VLM to confirm the final screen.", "cyan")
+                        trajectory_replay = None
+                    else:
+                        print_with_color(f"Screen diverged from the cached trajectory at step {trajectory_replay.position + 1}. Handing control to the VLM.", "yellow")
+                        trajectory_replay = None
+
+                if not replayed_step:
+                    status, rsp = mllm.get_model_response(prompt_to_vlm, [labeled_before])
+                    with open(log_explore_path, "a", encoding="utf-8") as f_log:
+                        f_log.write(f"Round {round_count} ({agent_mode.upper()} Mode) Explore Phase:\nPrompt: {prompt_to_vlm}\nResponse: {rsp}\n-----------------------------\n")
+
+                    if not status:
+                        print_with_color(f"VLM call failed: {rsp}. Ending current round.", "red")
+                        last_act = f"VLM call failed: {rsp}"
+                        time.sleep(configs.get("REQUEST_INTERVAL", 3))
+                        if round_count >= max_rounds_for_loop : break
+                        continue
+
+                    action_res = parse_explore_rsp(rsp)
+                    if not action_res or action_res[0] == "ERROR":
+                        print_with_color("Failed to parse VLM response for action. Ending current round.", "red")
+                        last_act = "Error in parsing VLM response."
+                        time.sleep(configs.get("REQUEST_INTERVAL", 3))
+                        if round_count >= max_rounds_for_loop : break
+                        continue
+
+                act_name = action_res[0]
+                if len(action_res) > 1 and act_name not in ["FINISH", "grid"]: 
+                    last_act = action_res[-1] 
+                elif act_name == "FINISH":
+                    if agent_mode == "task":
+                        last_act = "Task finished by agent."
+                        task_complete = True
+                    else: 
+                        last_act = "VLM unexpectedly chose FINISH in EXPLORE mode. Continuing exploration."
+                        print_with_color("VLM chose FINISH in EXPLORE mode. This is unexpected. Agent will continue if rounds permit.", "yellow")
+                elif act_name == "grid":
+                    last_act = "Switched to grid mode."
+                else:
+                    last_act = f"Executed {act_name}"
+
+                if agent_mode == "task" and act_name == "FINISH":
+                    print_with_color("Task marked as FINISH by VLM in TASK mode.", "green")
+                    if recorded_steps is not None and screen_fp:
+                        recorded_steps.append(step_from_action(screen_fp, action_res, ""))
+                    break
+
+                interacted_element_uid = ""
+                elem_idx = -1 
+
+                request_interval_str = configs.get("REQUEST_INTERVAL", "3")
+                try:
+                    current_request_interval = int(request_interval_str)
+                except ValueError:
+                    current_request_interval = 3
+
+
+                if act_name == "tap":
+                    elem_idx = action_res[1]
+                    if elem_table.has_label(elem_idx):
+                        x, y = elem_table.center(elem_idx)
+                        controller.tap(x, y)
+                        interacted_element_uid = elem_table.uid(elem_idx)
+                    else:
+                        print_with_color(f"Invalid element index for tap: {elem_idx}", "red")
+                        last_act += " (Invalid tap index)"; time.sleep(current_request_interval); 
+                        if round_count >= max_rounds_for_loop : break
+                        continue
+
+                elif act_name == "type_global":
+                    controller.text(action_res[1]) 
+
+                elif act_name == "long_press":
+                    elem_idx = action_res[1]
+                    if elem_table.has_label(elem_idx):
+                        x, y = elem_table.center(elem_idx)
+                        controller.long_press(x,y)
+                        interacted_element_uid = elem_table.uid(elem_idx)
+                    else:
+                        print_with_color(f"Invalid element index for long_press: {elem_idx}", "red")
+                        last_act += " (Invalid long_press index)"; time.sleep(current_request_interval); 
+                        if round_count >= max_rounds_for_loop : break
+                        continue
+
+                elif act_name == "swipe_element": 
+                    elem_idx, direction, distance = action_res[1], action_res[2], action_res[3]
+                    if elem_table.has_label(elem_idx):
+                        x, y = elem_table.center(elem_idx)
+                        controller.swipe_element(x, y, direction, distance)
+                        interacted_element_uid = elem_table.uid(elem_idx)
+                    else:
+                        print_with_color(f"Invalid element index for swipe_element: {elem_idx}", "red")
+                        last_act += " (Invalid swipe_element index)"; time.sleep(current_request_interval); 
+                        if round_count >= max_rounds_for_loop : break
+                        continue
+
+                elif act_name == "swipe_screen":
+                    direction, distance_str = action_res[1], action_res[2]
+                    dist_map = {"short": 0.25, "medium": 0.5, "long": 0.75}
+                    distance_factor = dist_map.get(distance_str.lower(), 0.5) 
+                    controller.swipe_screen_direction(direction, distance_factor)
+
+                elif act_name == "scroll_to":
+                    target, direction = action_res[1], action_res[2]
+                    scroll_result = controller.scroll_until_found(text=target, resource_id=target, content_desc=target, direction=direction)
+                    print_with_color(f"scroll_to('{target}'): {scroll_result.summary()}", "cyan")
+                    last_act += f" (scroll_to: {scroll_result.summary()})"
+
+                elif act_name == "delete_multiple":
+                    try:
+                        count = int(action_res[1])
+                        controller.delete_multiple(count)
+                    except (IndexError, ValueError):
+                        print_with_color(f"Invalid parameter for delete_multiple: {action_res}", "red")
+
+                elif act_name == "press_home": controller.press_home()
+                elif act_name == "press_enter": controller.press_enter()
+                elif act_name == "press_delete": controller.press_delete()
+                elif act_name == "open_notifications": controller.open_notifications()
+                elif act_name == "press_app_switch": controller.press_app_switch()
+                elif act_name == "press_back": controller.back()
+                elif act_name == "grid":
+                    print_with_color("GRID action called. Implement grid mode logic if needed.", "magenta")
+                else:
+                    print_with_color(f"Unknown action to execute: {act_name}", "red")
+                    last_act += f" (Unknown action: {act_name})"
+                    time.sleep(current_request_interval); 
+                    if round_count >= max_rounds_for_loop : break
+                    continue
+
+                _wait_for_ui(controller, adaptive_settle, current_request_interval, act_name)
+
+                if act_name == "swipe_element":
+                    round_action_key = action_key(act_name, interacted_element_uid, action_res[2], action_res[3])
+                elif act_name in ("swipe_screen", "scroll_to"):
+                    round_action_key = action_key(act_name, "", action_res[1], action_res[2])
+                else:
+                    round_action_key = action_key(act_name, interacted_element_uid)
+
+                if recorded_steps is not None:
+                    if screen_fp:
+                        recorded_steps.append(step_from_action(screen_fp, action_res, interacted_element_uid, elem_table))
+                    else:
+                        recorded_steps = None # A step without a fingerprint could not be verified on replay
+
+                element_details_for_reflection = "N/A"
+                if elem_idx != -1 and interacted_element_uid: 
+                    element_details_for_reflection = f"Element {elem_idx} (UID: {interacted_element_uid})"
+                elif act_name == "type_global":
+                    element_details_for_reflection = "Text input via type_global"
+                else: 
+                    element_details_for_reflection = f"Global action ({act_name})"
+
+                current_reflection_decision = "N/A"
+                if act_name not in ["grid"]:
+                    state_after = controller.capture_state(f"{round_count}_after", raw_screenshot_dir, xml_dir)
+                    screenshot_after, xml_after_path = state_after.screenshot, state_after.hierarchy
+                    screen_fp_after = None
+                    if screen_fp and xml_after_path not in ("ERROR", HIERARCHY_UNAVAILABLE):
+                        screen_fp_after = screen_fingerprint(xml_after_path)
+                        if screen_fp_after:
+                            screen_graph.record_transition(screen_fp, round_action_key, screen_fp_after)
+                            screen_graph.save()
+                    if replayed_step and (trajectory_replay is None or screen_fp_after is None
+                                          or screen_fp_after != trajectory_replay.expected_fingerprint()):
+                        # The replayed step did not lead where the recording did: reflect on it like any VLM step
+                        print_with_color("Replayed step led to an unexpected screen. Leaving the cached trajectory.", "yellow")
+                        trajectory_replay = None
+                        replayed_step = False
+                    ui_change = None
+                    if reflection_fast_path and hierarchy_available and xml_after_path not in ("ERROR", HIERARCHY_UNAVAILABLE):
+                        ui_change = diff_hierarchies(xml_path, xml_after_path)
+                        if ui_change is not None:
+                            print_with_color(f"UI change after {act_name}: {ui_change.summary()}", "cyan")
+
+                    if screenshot_after is None:
+                        print_with_color("Failed to get screenshot after action. Skipping reflection.", "red")
+                    elif (ui_change is not None and ui_change.is_unchanged(reflection_fast_path_threshold)
+                          and screens_match(screenshot_before, screenshot_after)):
+                        # Neither the hierarchy nor the pixels changed (the hierarchy alone misses WebView, canvas
+                        # and image content): the action was ineffective, no need to ask the VLM.
+                        current_reflection_decision = "INEFFECTIVE"
+                        print_with_color("Screen unchanged after action. Recording INEFFECTIVE without a reflection call.", "yellow")
+                        with open(log_reflect_path, "a", encoding="utf-8") as f_log:
+                            f_log.write(f"Round {round_count} ({agent_mode.upper()} Mode) Reflect Phase:\nLocal decision: INEFFECTIVE (UI diff: {ui_change.summary()})\n-----------------------------\n")
+                        if interacted_element_uid and screen_fp:
+                            ineffective_index.mark(screen_fp, interacted_element_uid)
+                            ineffective_index.save()
+                    elif replayed_step:
+                        print_with_color("Cached step replayed; its result is verified against the next screen instead of a reflection call.", "cyan")
+                    else:
+                        elem_table_after = ElementTable()
+                        if xml_after_path not in ("ERROR", HIERARCHY_UNAVAILABLE):
+                            elem_table_after = ElementTable.from_elements(extract_elements(xml_after_path))
+
+                        screenshot_after_labeled_path = os.path.join(screenshot_dir, f"{round_count}_after_labeled.png")
+                        labeled_after = draw_bbox_multi(screenshot_after, screenshot_after_labeled_path if save_labeled_screenshots else None, elem_table_after, dark_mode=str(configs.get("DARK_MODE", "false")).lower() == 'true')
+
+                        reflect_prompt = prompts.self_explore_reflect_template \
+                                            .replace("<task_desc>", task_desc_for_prompt) \
+                                            .replace("<action_type>", act_name) \
+                                            .replace("<element_details>", element_details_for_reflection) \
+                                            .replace("<last_act_summary>", last_act)
+
+                        pending_reflection = {"future": reflection_pool.submit(mllm.get_model_response, reflect_prompt, [labeled_before, labeled_after]),
+                                              "round": round_count, "prompt": reflect_prompt, "uid": interacted_element_uid,
+                                              "screen_fp": screen_fp, "interval": current_request_interval}
+                        if not pipeline_rounds:
+                            current_reflection_decision = resolve_reflection(pending_reflection)
+                            pending_reflection = None
+
+                    if pipeline_rounds and screenshot_after is not None and xml_after_path != "ERROR":
+                        carried_state = state_after
+
+                # Steps that changed nothing or were undone are not worth replaying
+                if recorded_steps and current_reflection_decision in ("INEFFECTIVE", "BACK"):
+                    recorded_steps.pop()
+
+                # End of round sleep, ensuring it happens unless 'BACK' was just decided and executed by reflection.
+                # However, the controller.back() call now includes its own sleep.
+                # A simple unconditional sleep here ensures consistent round timing if other paths are taken.
+                # The previous logic: `if act_name != "press_back" or decision != "BACK":`
+                # might be complex if `decision` is not always set from reflection.
+                # Let's ensure a delay unless the BACK action from reflection *just* happened.
+                if not (act_name == "press_back" and current_reflection_decision == "BACK"): # Avoid double sleep if reflection did BACK
+                     # The general action execution already has a time.sleep(current_request_interval).
+                     # Reflection's BACK also has a sleep. So, this might be redundant unless other actions don't have sleeps.
+                     # For simplicity, removing this potentially redundant end-of-round sleep, 
+                     # relying on sleeps after action execution or after reflection's BACK.
+                     pass
+
+
+            if pending_reflection is not None: # Reflection of the last round
+                if task_complete:
+                    # The task already finished: keep the reflection's log and docs, but leave the screen and the
+                    # recorded trajectory as they were at FINISH
+                    resolve_reflection(pending_reflection, navigate=False)
+                elif resolve_reflection(pending_reflection) in ("INEFFECTIVE", "BACK") and recorded_steps:
+                    recorded_steps.pop()
+                pending_reflection = None
+
+            if crash_aborted:
+                result.status = "aborted"
+            elif not manual_stop_requested:
+                result.status = "completed" if agent_mode == "task" and task_complete else "max_rounds"
+                if agent_mode == "task" and task_complete:
+                    print_with_color("Task completed successfully!", "green")
+                    if trajectory_cache is not None and recorded_steps:
+                        trajectory_cache.store(package_name, task_desc_for_prompt, recorded_steps)
+                        print_with_color(f"Stored a {len(recorded_steps)}-step trajectory for this task.", "cyan")
+                elif agent_mode == "task" and not task_complete:
+                    print_with_color(f"Max rounds ({max_rounds_for_loop}) reached for TASK. Task may not be complete.", "yellow")
+                elif agent_mode == "explore":
+                    print_with_color(f"Max rounds ({max_rounds_for_loop}) reached for EXPLORATION. Exploration session ended.", "blue")
+
+            print_with_color(f"Total documentations generated/updated: {doc_count}", "blue")
+            if app_event_count:
+                print_with_color(f"App crashes/ANRs during this run: {app_event_count} (see {crash_log_path})", "red")
+            if foreground_watchdog.counts["left_app"]:
+                print_with_color(f"Foreground watchdog: {foreground_watchdog.summary()}", "blue")
+
+        except KeyboardInterrupt:
+            print_with_color("\nManual interruption (Ctrl+C) detected. Initiating graceful shutdown...", "orange")
+            manual_stop_requested = True
+            result.status = "interrupted"
+        except Exception as e:
+            print_with_color(f"An unexpected error occurred during main operation: {e}", "red")
+            traceback.print_exc()
+            manual_stop_requested = True 
+            result.status = "error"
+
+        finally:
+            print_with_color("Executing finally block: Closing app and cleaning up...", "cyan")
+            self._cleanup_task(package_name, screenshot_dir, xml_dir, log_dir, docs_dir)
+            print_with_color("Agent shutdown process complete.", "blue")
+            if manual_stop_requested:
+                if agent_mode == "task" and not task_complete: print_with_color("Task was manually interrupted and may not be complete.", "yellow")
+                elif agent_mode == "explore": print_with_color("Exploration was manually interrupted.", "yellow")
+
+            result.rounds = round_count
+            result.doc_count = doc_count
+            result.app_events = app_event_count
+            result.duration_s = round(time.time() - task_start, 3)
+        return result
@@ -1,22 +1,47 @@
+import base64
+import hashlib
+import io
 import os
+import re
 import subprocess
+import tempfile
 import xml.etree.ElementTree as ET
 import shlex
+import cv2
+import numpy as np
+from .adb_session import AdbShellSession
+from .logcat_monitor import LogcatMonitor
+from .adb_wire import ADB_TIMEOUT_ERROR, get_wire_client, run_wire_command, run_wire_exec_out, wire_backend_enabled
 from .config import load_config
-from .utils import print_with_color
+from .ui_diff import diff_hierarchies
+from .utils import print_with_color, to_bgr
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 
 configs = load_config()
 
-def _run_adb_command_base(device_id: str | None, command_args: list):
-    """Internal helper to run ADB commands."""
-    base_cmd = ["adb"]
-    if device_id:
-        base_cmd.extend(["-s", device_id])
-    full_cmd = base_cmd + command_args
-    
-    cmd_str_for_print = " ".join(full_cmd) # For logging
+# Returned by hierarchy captures that hit their deadline; callers should carry on without element labels.
+HIERARCHY_UNAVAILABLE = "HIERARCHY_UNAVAILABLE"
+
+# ADBKeyBoard (github.com/senzhk/ADBKeyBoard): an IME that commits whole strings received as a broadcast
+ADB_KEYBOARD_IME = "com.android.adbkeyboard/.AdbIME"
+
+# Shell commands that are safe to run a second time (reads and writes that converge to the same state). Anything
+# else, e.g. `input tap` or `am broadcast`, may already have run on the device when a session dies mid-command.
+_IDEMPOTENT_SHELL_COMMANDS = ("true", "echo", "sleep", "cat", "ls", "mkdir", "rm", "grep", "getprop", "dumpsys", "wm size",
+                              "settings get", "settings put", "settings delete", "pm list", "pm path", "ime list",
+                              "ime enable", "ime set", "am force-stop", "uiautomator dump", "screencap", "pidof")
+
+def _is_idempotent_shell_command(command: str) -> bool:
+    parts = re.split(r"&&|\|\||;|\|", command)
+    return all(part.strip().startswith(_IDEMPOTENT_SHELL_COMMANDS) for part in parts if part.strip())
+
+_INPUT_TEXT_ARG_RE = re.compile(r"""(input text )('[^']*'(?:"'"'[^']*')*|\S+)""")
+_IME_TEXT_ARG_RE = re.compile(r"(ADB_INPUT_B64 --es msg )\S+")
+
+def _format_command_for_log(base_cmd: list, command_args: list) -> str:
+    cmd_str_for_print = " ".join(base_cmd + command_args) # For logging
     # Special handling for text input to avoid logging sensitive info directly
     if "input" in command_args and "text" in command_args:
         try:
@@ -28,13 +53,35 @@ def _run_adb_command_base(device_id: str | None, command_args: list):
                 cmd_str_for_print = " ".join(base_cmd + temp_args)
         except ValueError:
             pass # Should not happen if 'text' is present
-            
-    print_with_color(f"Executing: {cmd_str_for_print}", "yellow")
+    # Text inside a pre-joined shell string (see _text_command): the shell-quoted `input text` argument and the
+    # base64 payload of the ADBKeyBoard broadcast
+    cmd_str_for_print = _INPUT_TEXT_ARG_RE.sub(r"\1<hidden_text>", cmd_str_for_print)
+    return _IME_TEXT_ARG_RE.sub(r"\1<hidden_text>", cmd_str_for_print)
+
+def _run_adb_command_base(device_id: str | None, command_args: list, timeout=None):
+    """Internal helper to run ADB commands. A `timeout` (seconds) turns a hung command into ("ERROR", ADB_TIMEOUT_ERROR)."""
+    base_cmd = ["adb"]
+    if device_id:
+        base_cmd.extend(["-s", device_id])
+    full_cmd = base_cmd + command_args
+    
+    print_with_color(f"Executing: {_format_command_for_log(base_cmd, command_args)}", "yellow")
+
+    if wire_backend_enabled(configs):
+        wire_result = run_wire_command(get_wire_client(configs), device_id, command_args, timeout)
+        if wire_result is not None:
+            stdout, stderr, exit_code = wire_result
+            if exit_code != 0:
+                print_with_color(f"Command failed: {_format_command_for_log(base_cmd, command_args)}", "red")
+                if stderr:
+                    print_with_color(f"Stderr: {stderr.strip()}", "red")
+                return "ERROR", stderr.strip() if stderr else "Unknown ADB error"
+            return stdout.strip(), None
 
     try:
-        result = subprocess.run(full_cmd, capture_output=True, text=True, check=False) # check=False to inspect manually
+        result = subprocess.run(full_cmd, capture_output=True, text=True, check=False, timeout=timeout) # check=False to inspect manually
         if result.returncode != 0:
-            print_with_color(f"Command failed: {' '.join(full_cmd)}", "red")
+            print_with_color(f"Command failed: {_format_command_for_log(base_cmd, command_args)}", "red")
             if result.stderr:
                 print_with_color(f"Stderr: {result.stderr.strip()}", "red")
             return "ERROR", result.stderr.strip() if result.stderr else "Unknown ADB error"
@@ -42,6 +89,9 @@ def _run_adb_command_base(device_id: str | None, command_args: list):
              # print_with_color(f"Output: {result.stdout.strip()}", "cyan") # Optional: for debugging success output
             pass # Most commands don't need their success stdout printed by default
         return result.stdout.strip(), None # Return stdout, no error
+    except subprocess.TimeoutExpired:
+        print_with_color(f"Command timed out after {timeout}s: {_format_command_for_log(base_cmd, command_args)}", "red")
+        return "ERROR", ADB_TIMEOUT_ERROR
     except FileNotFoundError:
         msg = "Error: 'adb' command not found. Make sure ADB is installed and in your system's PATH."
         print_with_color(msg, "red")
@@ -56,11 +106,196 @@ def _run_adb_command_base(device_id: str | None, command_args: list):
         print_with_color(msg, "red")
         return "ERROR", msg
 
+def _run_adb_binary_base(device_id: str | None, command_args: list, timeout=None):
+    """
+    Like _run_adb_command_base, but returns raw stdout bytes (for exec-out streams such as screencap).
+    Returns (stdout_bytes, None) on success or (b"", error_message) on failure; ADB_TIMEOUT_ERROR marks a timeout.
+    """
+    base_cmd = ["adb"]
+    if device_id:
+        base_cmd.extend(["-s", device_id])
+    full_cmd = base_cmd + command_args
+    print_with_color(f"Executing: {' '.join(full_cmd)}", "yellow")
+
+    if wire_backend_enabled(configs):
+        wire_result = run_wire_exec_out(get_wire_client(configs), device_id, command_args, timeout)
+        if wire_result is not None:
+            stdout, err = wire_result
+            if err:
+                print_with_color(f"Command failed: {' '.join(full_cmd)}: {err}", "red")
+            return stdout, err
+
+    try:
+        result = subprocess.run(full_cmd, capture_output=True, check=False, timeout=timeout)
+        if result.returncode != 0:
+            stderr = result.stderr.decode("utf-8", errors="replace").strip()
+            print_with_color(f"Command failed: {' '.join(full_cmd)}", "red")
+            if stderr:
+                print_with_color(f"Stderr: {stderr}", "red")
+            return b"", stderr if stderr else "Unknown ADB error"
+        return result.stdout, None
+    except subprocess.TimeoutExpired:
+        print_with_color(f"Command timed out after {timeout}s: {' '.join(full_cmd)}", "red")
+        return b"", ADB_TIMEOUT_ERROR
+    except FileNotFoundError:
+        msg = "Error: 'adb' command not found. Make sure ADB is installed and in your system's PATH."
+        print_with_color(msg, "red")
+        return b"", msg
+    except Exception as e:
+        msg = f"An unexpected error occurred with adb command: {e}"
+        print_with_color(msg, "red")
+        return b"", msg
+
+def parse_raw_screencap(data: bytes):
+    """
+    Parses unencoded `screencap` output (no -p) into an (height, width, 4) RGBA uint8 array.
+    The pixel payload is wrapped with np.frombuffer, so no copy is made; the result is read-only.
+    Header is width, height, pixel format (little-endian u32), plus a u32 color space on Android 9+.
+    Returns None if the buffer is malformed or the pixel format is not 32-bit RGBA/RGBX.
+    """
+    if len(data) < 12:
+        return None
+    width, height, pixel_format = np.frombuffer(data, dtype="<u4", count=3)
+    payload_size = int(width) * int(height) * 4
+    header_size = len(data) - payload_size
+    if header_size not in (12, 16) or payload_size == 0:
+        print_with_color(f"Unexpected raw screencap size: {len(data)} bytes for {width}x{height}", "red")
+        return None
+    if pixel_format not in (1, 2): # PIXEL_FORMAT_RGBA_8888 / RGBX_8888
+        print_with_color(f"Unsupported raw screencap pixel format: {pixel_format}", "red")
+        return None
+    return np.frombuffer(data, dtype=np.uint8, count=payload_size, offset=header_size).reshape(int(height), int(width), 4)
+
 class AndroidElement:
-    def __init__(self, uid, bbox, attrib):
+    def __init__(self, uid, bbox, attrib, clickable=False, focusable=False, role_hints=None):
         self.uid = uid
         self.bbox = bbox
-        self.attrib = attrib
+        self.clickable = clickable
+        self.focusable = focusable
+        self.role_hints = role_hints or [] # e.g. ["search_bar"], ["nav_item"]
+        # attrib is the comma-joined summary, e.g. "clickable,search_bar"; derived from the flags when not given
+        self.attrib = attrib if attrib is not None else self._build_attrib()
+
+    def _build_attrib(self):
+        flags = [name for name, is_set in (("clickable", self.clickable), ("focusable", self.focusable)) if is_set]
+        return ",".join(flags + self.role_hints)
+
+    def merge_flags(self, clickable=False, focusable=False):
+        """Folds in the predicates of a duplicate node collapsed onto this element."""
+        self.clickable = self.clickable or clickable
+        self.focusable = self.focusable or focusable
+        self.attrib = self._build_attrib()
+
+class CaptureState:
+    """
+    Screenshot and UI hierarchy captured together by AndroidController.capture_state.
+    screenshot: image array or None; hierarchy: XML bytes, HIERARCHY_UNAVAILABLE or "ERROR".
+    *_time: wall-clock time (time.time()) at which each capture completed.
+    """
+    def __init__(self, screenshot, hierarchy, screenshot_time, hierarchy_time):
+        self.screenshot = screenshot
+        self.hierarchy = hierarchy
+        self.screenshot_time = screenshot_time
+        self.hierarchy_time = hierarchy_time
+
+class InputBatch:
+    """
+    Ordered list of input primitives (taps, swipes, keyevents, text) that AndroidController.run_input_batch sends to
+    the device as a single shell command. Builder methods return the batch, so calls can be chained:
+    InputBatch().tap(100, 200).keyevent(67, 67).text("hello").keyevent(66)
+    """
+    def __init__(self):
+        self.steps = [] # ("keyevent", [codes]), ("text", str) or ("command", "input ...")
+
+    def __len__(self):
+        return len(self.steps)
+
+    def keyevent(self, *keycodes):
+        # Consecutive keyevents are merged into one multi-keycode `input keyevent` call
+        if self.steps and self.steps[-1][0] == "keyevent":
+            self.steps[-1][1].extend(str(code) for code in keycodes)
+        elif keycodes:
+            self.steps.append(("keyevent", [str(code) for code in keycodes]))
+        return self
+
+    def tap(self, x, y):
+        self.steps.append(("command", f"input tap {int(x)} {int(y)}"))
+        return self
+
+    def swipe(self, x1, y1, x2, y2, duration=400):
+        self.steps.append(("command", f"input swipe {int(x1)} {int(y1)} {int(x2)} {int(y2)} {int(duration)}"))
+        return self
+
+    def long_press(self, x, y, duration=1000):
+        return self.swipe(x, y, x, y, duration)
+
+    def text(self, input_str):
+        if input_str:
+            self.steps.append(("text", input_str))
+        return self
+
+    def sleep(self, seconds):
+        """On-device pause between two primitives, e.g. to let a field gain focus before typing."""
+        self.steps.append(("command", f"sleep {float(seconds):g}"))
+        return self
+
+    def compile(self, ime_text=False) -> str:
+        """The batch as one shell script; it stops at the first primitive that fails. See _text_command for ime_text."""
+        commands = []
+        for kind, arg in self.steps:
+            if kind == "keyevent":
+                commands.append(f"input keyevent {' '.join(arg)}")
+            elif kind == "text":
+                commands.append(_text_command(arg, ime_text))
+            else:
+                commands.append(arg)
+        return " && ".join(commands)
+
+def _text_command(input_str, ime_text=False):
+    """
+    Device shell command typing input_str. With ime_text, one ADBKeyBoard broadcast carrying the UTF-8 string as
+    base64 (shell-safe, any script); otherwise `input text` with spaces as %s, quoted for the shell (ASCII only).
+    """
+    input_text = f"input text {shlex.quote(input_str.replace(' ', '%s'))}"
+    if not ime_text:
+        return input_text
+    broadcast = f"am broadcast -a ADB_INPUT_B64 --es msg {base64.b64encode(input_str.encode('utf-8')).decode('ascii')}"
+    # `am broadcast` exits 0 even when nothing receives it, so only broadcast while ADBKeyBoard is still the active
+    # input method (the user or the app may have switched it), and fall back to `input text` on the device otherwise.
+    # Parenthesized as a whole so that, inside an InputBatch `&&` chain, the fallback never runs after a failed step.
+    return f"( ( [ \"$(settings get secure default_input_method)\" = {ADB_KEYBOARD_IME} ] && {broadcast} ) || {input_text} )"
+
+class ScrollResult:
+    """Outcome of AndroidController.scroll_until_found. bounds is the match's [x1, y1, x2, y2], or None."""
+    def __init__(self, bounds, swipes, reason):
+        self.bounds = bounds
+        self.swipes = swipes
+        self.reason = reason # "found", "end_of_list", "max_swipes" or "error"
+
+    @property
+    def found(self):
+        return self.bounds is not None
+
+    def summary(self):
+        if self.found:
+            return f"found after {self.swipes} swipe(s)"
+        return {"end_of_list": f"not found, reached the end of the list after {self.swipes} swipe(s)",
+                "max_swipes": f"not found within {self.swipes} swipe(s)"}.get(self.reason, "scroll failed")
+
+def _settings_restore_command(saved_settings):
+    """Shell command putting back (namespace, key, original value) settings; originally unset ones are deleted."""
+    return " ; ".join(f"settings delete {ns} {key}" if original == "null" else f"settings put {ns} {key} {shlex.quote(original)}"
+                      for ns, key, original in saved_settings)
+
+def restore_saved_settings(device_id, saved_settings):
+    """
+    Restores settings recorded by AndroidController.saved_settings without a controller, e.g. for a device whose
+    agent process was killed before it could restore them itself. Returns the error, or None on success.
+    """
+    if not saved_settings:
+        return None
+    _, err = _run_adb_command_base(device_id, ["shell", _settings_restore_command(saved_settings)])
+    return err
 
 def list_all_devices():
     # Uses the new _run_adb_command_base (device_id is None for global adb commands)
@@ -78,119 +313,220 @@ def list_all_devices():
             devices.append(line.split("\t")[0])
     return devices
 
-def get_id_from_element(elem):
+# Precompiled role-hint matchers. Every search keyword contains "search", "query" or "find", and every nav keyword
+# contains "nav", "tab", "action_bar" or "toolbar", so one alternation reproduces the original keyword lists. The
+# groups never overlap, so a single finditer pass over the joined attributes tells us whether either kind occurs.
+_ROLE_KEYWORDS_RE = re.compile(r"(?P<search>search|query|find)|(?P<nav>nav|tab|action_bar|toolbar)")
+_EDITTEXT_SEARCH_RE = re.compile(r"search|query")
+
+def _parse_bounds(elem):
+    """Parses a node's "[x1,y1][x2,y2]" bounds into [x1, y1, x2, y2]; None if missing or malformed."""
     bounds = elem.get("bounds")
-    elem_w, elem_h = 0, 0 
-    if bounds:
-        try:
-            coord = []
-            for i in bounds.replace("][", ",").replace("[", "").replace("]", "").split(","):
-                coord.append(int(i))
-            if len(coord) == 4:
-                 elem_w, elem_h = coord[2] - coord[0], coord[3] - coord[1]
-            else:
-                print_with_color(f"Unexpected bounds format for element {elem.get('class')}: {bounds}", "red")
-        except ValueError as e:
-            print_with_color(f"Error parsing bounds for element {elem.get('class')}: {bounds}, Error: {e}", "red")
+    if not bounds:
+        return None
+    try:
+        coord = [int(i) for i in bounds.replace("][", ",").replace("[", "").replace("]", "").split(",")]
+    except ValueError as e:
+        print_with_color(f"Error parsing bounds for element {elem.get('class')}: {bounds}, Error: {e}", "red")
+        return None
+    if len(coord) != 4:
+        print_with_color(f"Unexpected bounds format for element {elem.get('class')}: {bounds}", "red")
+        return None
+    return coord
+
+def _identify_element(elem, coord):
+    """Computes (elem_id, role_hint) for a node whose bounds were already parsed into `coord` (or None)."""
+    elem_w, elem_h = (coord[2] - coord[0], coord[3] - coord[1]) if coord else (0, 0)
 
-    if elem.get("resource-id"):
-        elem_id = elem.get("resource-id").replace("/", "_").replace(":", ".")
+    resource_id = elem.get("resource-id")
+    content_desc_raw = elem.get("content-desc")
+    if resource_id:
+        elem_id = resource_id.replace("/", "_").replace(":", ".")
     else:
         elem_id = f"{elem.get('class', 'UnknownClass')}_{elem_w}_{elem_h}" # Add default for class
-    if elem.get("content-desc") and len(elem.get("content-desc")) < 20:
-        elem_id += "_" + elem.get("content-desc").replace(" ", "").replace("/", "_")
+    if content_desc_raw and len(content_desc_raw) < 20:
+        elem_id += "_" + content_desc_raw.replace(" ", "").replace("/", "_")
 
     role_hint = None
-    res_id = elem.get("resource-id", "").lower()
-    content_desc = elem.get("content-desc", "").lower()
+    res_id = (resource_id or "").lower()
+    content_desc = (content_desc_raw or "").lower()
     text_val = elem.get("text", "").lower() # Text attribute from XML
     elem_class = elem.get("class", "").lower()
 
-    search_keywords = ["search", "query", "find", "search_box", "search_bar", "edit_query", "search_src_text", "search_plate"]
-    nav_keywords = ["nav", "navigation", "navbar", "tab", "action_bar", "bottom_nav", "toolbar"] # Added toolbar
+    has_search_keyword = has_nav_keyword = False
+    for match in _ROLE_KEYWORDS_RE.finditer(f"{res_id}\x00{content_desc}\x00{text_val}"):
+        if match.lastgroup == "search":
+            has_search_keyword = True
+            break
+        has_nav_keyword = True
 
     # Search bar identification
-    if (any(keyword in res_id for keyword in search_keywords) or
-       any(keyword in content_desc for keyword in search_keywords) or
-       any(keyword in text_val for keyword in search_keywords) or
-       ("edittext" in elem_class and any(keyword in text_val + res_id + content_desc for keyword in ["search", "query"])) or
+    if (has_search_keyword or
+       ("edittext" in elem_class and _EDITTEXT_SEARCH_RE.search(text_val + res_id + content_desc)) or
        "searchview" in elem_class):
         role_hint = "search_bar"
     # Navigation item/bar identification
-    elif (any(keyword in res_id for keyword in nav_keywords) or
-         any(keyword in content_desc for keyword in nav_keywords) or
-         any(keyword in text_val for keyword in nav_keywords) or
+    elif (has_nav_keyword or
          ("tabwidget" in elem_class or "bottomnavigationview" in elem_class or "toolbar" in elem_class and "action_bar" not in res_id)):
-        if elem.get("clickable") == "true" and role_hint is None: # Prioritize search if already found
+        if elem.get("clickable") == "true": # Search (checked first) takes priority
              role_hint = "nav_item"
-        elif role_hint is None: # If not clickable but a nav container
+        else: # If not clickable but a nav container
              role_hint = "nav_bar_container"
 
-
     return elem_id, role_hint
 
-def traverse_tree(xml_path, elem_list, attrib, add_index=False):
-    path = []
+def get_id_from_element(elem):
+    return _identify_element(elem, _parse_bounds(elem))
+
+def _iter_interactive_nodes(xml_path, attribs, add_index=False):
+    """
+    Single iterparse pass over a hierarchy dump (file path or XML bytes).
+    Yields (elem_id, coord, matched_attribs, role_hints) for every node with at least one of `attribs` set to "true".
+    Each node's bounds, identity and role hint are computed exactly once, on its start event, and carried on the
+    traversal stack so children reuse them for the parent prefix and nav_bar_container inheritance.
+    """
+    # xml_path may also be the XML content itself (bytes), e.g. from AndroidController.get_hierarchy
+    xml_source = io.BytesIO(xml_path) if isinstance(xml_path, (bytes, bytearray)) else xml_path
+    stack = [] # (elem, elem_id_raw, role_hint) for each open ancestor
     try:
-        for event, elem in ET.iterparse(xml_path, ('start', 'end')):
+        for event, elem in ET.iterparse(xml_source, ('start', 'end')):
             if event == 'start':
-                parent_prefix = ""
-                current_parent_element = None
-                if len(path) > 0:
-                    current_parent_element = path[-1]
-                    parent_id_raw, _ = get_id_from_element(current_parent_element) # Parent hint not used here for prefix
-                    parent_prefix = parent_id_raw + "."
-                
-                path.append(elem)
-                if elem.get(attrib) == "true":
-                    try:
-                        current_bounds = elem.get("bounds")
-                        if not current_bounds:
-                            continue
-                        coord = []
-                        for i in current_bounds.replace("][", ",").replace("[", "").replace("]", "").split(","):
-                            coord.append(int(i))
-                        if len(coord) != 4: continue
-
-                        center = (coord[0] + coord[2]) // 2, (coord[1] + coord[3]) // 2
-                        close = False
-                        min_dist_val = int(configs.get("MIN_DIST", 30))
-                        for e in elem_list:
-                            if e.bbox and len(e.bbox) == 2 and e.bbox[0] and len(e.bbox[0]) == 2 and e.bbox[1] and len(e.bbox[1]) == 2:
-                                e_center_x = (e.bbox[0][0] + e.bbox[1][0]) // 2
-                                e_center_y = (e.bbox[0][1] + e.bbox[1][1]) // 2
-                                if abs(e_center_x - center[0]) + abs(e_center_y - center[1]) < min_dist_val:
-                                    close = True
-                                    break
-                        if not close:
-                            elem_id_raw, role_hint = get_id_from_element(elem)
-                            elem_id = parent_prefix + elem_id_raw
-                            if add_index:
-                                elem_id += "." + elem.get("index", "0")
-                            
-                            current_attrib_value = attrib # This is "clickable" or "focusable"
-                            if role_hint:
-                                current_attrib_value += f",{role_hint}"
-                                # If a parent was a nav_bar_container, this item might be a nav_item
-                                if current_parent_element is not None:
-                                    _, parent_role_hint = get_id_from_element(current_parent_element)
-                                    if parent_role_hint == "nav_bar_container" and "nav_item" not in current_attrib_value:
-                                         current_attrib_value += ",nav_item"
-
-
-                            elem_list.append(AndroidElement(elem_id, (tuple(coord[0:2]), tuple(coord[2:4])), current_attrib_value))
-                    except Exception as e:
-                        print_with_color(f"Error processing element: {elem.tag} attributes: {elem.attrib} with error {e}", "red")
-                        continue
+                parent = stack[-1] if stack else None
+                coord = _parse_bounds(elem)
+                elem_id_raw, role_hint = _identify_element(elem, coord)
+                stack.append((elem, elem_id_raw, role_hint))
+
+                matched_attribs = [a for a in attribs if elem.get(a) == "true"]
+                if not matched_attribs or coord is None:
+                    continue
+                elem_id = (parent[1] + "." if parent else "") + elem_id_raw
+                if add_index:
+                    elem_id += "." + elem.get("index", "0")
+
+                role_hints = []
+                if role_hint:
+                    role_hints.append(role_hint)
+                    # If a parent was a nav_bar_container, this item might be a nav_item
+                    if parent is not None and parent[2] == "nav_bar_container" and "nav_item" not in role_hints:
+                         role_hints.append("nav_item")
+
+                yield elem_id, coord, matched_attribs, role_hints
             elif event == 'end':
-                if path and path[-1] == elem: 
-                     path.pop()
+                if stack and stack[-1][0] is elem:
+                     stack.pop()
     except ET.ParseError as e:
-        print_with_color(f"Error parsing XML file {xml_path}: {e}", "red")
+        print_with_color(f"Error parsing XML {'buffer' if xml_source is not xml_path else 'file ' + str(xml_path)}: {e}", "red")
+
+class _ProximityIndex:
+    """
+    Uniform grid hash over element centers for the MIN_DIST "too close" check.
+    Cells are MIN_DIST wide, so any center within Manhattan distance MIN_DIST lies in the 3x3 block of cells around
+    the query point: inserts and lookups are near-constant time instead of a scan over every element so far.
+    """
+    def __init__(self, min_dist_val, elem_list=()):
+        self.min_dist_val = min_dist_val
+        self.cell_size = max(1, min_dist_val)
+        self.cells = {}
+        self.count = 0
+        for e in elem_list:
+            if e.bbox and len(e.bbox) == 2 and e.bbox[0] and len(e.bbox[0]) == 2 and e.bbox[1] and len(e.bbox[1]) == 2:
+                self.add(((e.bbox[0][0] + e.bbox[1][0]) // 2, (e.bbox[0][1] + e.bbox[1][1]) // 2), e)
+
+    def add(self, center, elem):
+        key = (center[0] // self.cell_size, center[1] // self.cell_size)
+        self.cells.setdefault(key, []).append((self.count, center, elem))
+        self.count += 1
+
+    def find_close(self, center):
+        """Returns the earliest-inserted element whose center is closer than MIN_DIST (Manhattan), or None."""
+        if self.min_dist_val <= 0:
+            return None
+        cx, cy = center[0] // self.cell_size, center[1] // self.cell_size
+        best = None
+        for gx in (cx - 1, cx, cx + 1):
+            for gy in (cy - 1, cy, cy + 1):
+                for order, (ex, ey), elem in self.cells.get((gx, gy), ()):
+                    if abs(ex - center[0]) + abs(ey - center[1]) < self.min_dist_val and (best is None or order < best[0]):
+                        best = (order, elem)
+        return best[1] if best else None
+
+def traverse_tree(xml_path, elem_list, attrib, add_index=False):
+    min_dist_val = int(configs.get("MIN_DIST", 30))
+    index = _ProximityIndex(min_dist_val, elem_list)
+    for elem_id, coord, _, role_hints in _iter_interactive_nodes(xml_path, (attrib,), add_index):
+        center = (coord[0] + coord[2]) // 2, (coord[1] + coord[3]) // 2
+        if index.find_close(center) is None:
+            elem = AndroidElement(elem_id, (tuple(coord[0:2]), tuple(coord[2:4])), ",".join([attrib] + role_hints),
+                                  clickable=attrib == "clickable", focusable=attrib == "focusable", role_hints=role_hints)
+            elem_list.append(elem)
+            index.add(center, elem)
+
+def extract_elements(xml_path, add_index=False):
+    """
+    Builds the merged clickable + focusable element list from ONE parse of the hierarchy.
+    Equivalent to traverse_tree(..., "clickable") followed by traverse_tree(..., "focusable"), except that nodes
+    matching both predicates, or a focusable node within MIN_DIST of an already-labeled element, are collapsed into
+    a single element whose clickable/focusable flags are merged. Clickable elements keep priority and come first.
+    """
+    clickable_nodes, focusable_nodes = [], []
+    for node in _iter_interactive_nodes(xml_path, ("clickable", "focusable"), add_index):
+        (clickable_nodes if "clickable" in node[2] else focusable_nodes).append(node)
+
+    elem_list = []
+    index = _ProximityIndex(int(configs.get("MIN_DIST", 30)))
+    for elem_id, coord, matched_attribs, role_hints in clickable_nodes + focusable_nodes:
+        center = (coord[0] + coord[2]) // 2, (coord[1] + coord[3]) // 2
+        existing = index.find_close(center)
+        if existing is not None:
+            existing.merge_flags(clickable="clickable" in matched_attribs, focusable="focusable" in matched_attribs)
+            continue
+        elem = AndroidElement(elem_id, (tuple(coord[0:2]), tuple(coord[2:4])), None,
+                              clickable="clickable" in matched_attribs, focusable="focusable" in matched_attribs,
+                              role_hints=role_hints)
+        elem_list.append(elem)
+        index.add(center, elem)
+    return elem_list
+
+def find_node(xml_source, text=None, resource_id=None, content_desc=None):
+    """
+    Bounds [x1, y1, x2, y2] of the first node in a hierarchy dump (file path or XML bytes) matching any given
+    criterion, or None. text and content_desc match case-insensitive substrings; resource_id matches the full id
+    ("com.app:id/title") or just its name ("title").
+    """
+    text, content_desc = (value.lower() if value else None for value in (text, content_desc))
+    source = io.BytesIO(xml_source) if isinstance(xml_source, (bytes, bytearray)) else xml_source
+    try:
+        for _, elem in ET.iterparse(source):
+            if elem.tag != "node":
+                continue
+            node_id = elem.get("resource-id", "")
+            if ((text and text in elem.get("text", "").lower())
+                    or (content_desc and content_desc in elem.get("content-desc", "").lower())
+                    or (resource_id and node_id and resource_id in (node_id, node_id.split(":id/")[-1]))):
+                bounds = _parse_bounds(elem)
+                if bounds is not None:
+                    return bounds
+    except (ET.ParseError, OSError) as e:
+        print_with_color(f"Error parsing hierarchy while searching for a node: {e}", "red")
+    return None
 
 class AndroidController:
-    def __init__(self, device):
+    def __init__(self, device, use_shell_session=None):
         self.device = device
+        self.shell_session = None
+        self._capture_pool = None
+        self.last_launch_time_ms = None # Measured by launch_app in 'am' / 'poll' LAUNCH_MODE
+        self.last_launch_state = None
+        self.logcat_monitor = None
+        self._saved_settings = [] # (namespace, key, original value) written by apply_device_profile / enable_adb_keyboard
+        self.ime_text_input = False # True while text is typed through ADBKeyBoard broadcasts
+        if use_shell_session is None:
+            use_shell_session = str(configs.get("ADB_SHELL_SESSION", "false")).lower() == 'true'
+        if use_shell_session and wire_backend_enabled(configs):
+            print_with_color("ADB_BACKEND is 'wire': commands already reuse the adb server socket, skipping shell session.", "cyan")
+        elif use_shell_session:
+            self._start_shell_session()
+
         self.device_screenshot_dir = configs.get("ANDROID_SCREENSHOT_DIR", "/sdcard/").replace("\\\\", "/")
         self.device_xml_dir = configs.get("ANDROID_XML_DIR", "/sdcard/").replace("\\\\", "/")
         
@@ -201,16 +537,191 @@ class AndroidController:
         if self.width == 0 and self.height == 0:
             print_with_color("Failed to get device size. Ensure the device is connected and accessible.", "red")
 
-    def _execute_command(self, command_args: list):
+        if str(configs.get("DEVICE_PROFILE", "true")).lower() == 'true':
+            self.apply_device_profile(str(configs.get("DEVICE_PROFILE_DISABLE_SUGGESTIONS", "false")).lower() == 'true')
+
+        text_input_mode = str(configs.get("TEXT_INPUT_MODE", "auto")).lower()
+        if text_input_mode in ("auto", "ime"):
+            self.ime_text_input = self.enable_adb_keyboard(warn_if_missing=text_input_mode == "ime")
+
+    def _start_shell_session(self):
+        try:
+            session_timeout = float(configs.get("ADB_SHELL_SESSION_TIMEOUT", 10))
+        except ValueError:
+            session_timeout = 10.0
+        session = AdbShellSession(self.device, timeout=session_timeout)
+        if session.start():
+            self.shell_session = session
+            print_with_color(f"Persistent adb shell session started for device {self.device}.", "green")
+        else:
+            print_with_color("Could not start persistent adb shell session. Using one-shot adb commands.", "yellow")
+
+    def _run_in_shell_session(self, session, shell_args: list, timeout=None):
+        """
+        Runs a 'shell' command through the persistent `session`.
+        Returns the same (stdout, err) pair as _run_adb_command_base, or None if the session is unusable and the
+        command can safely be re-run as a one-shot adb command.
+        """
+        # adb joins shell arguments with spaces before handing them to the device shell, so do the same here.
+        print_with_color(f"Executing (session): {_format_command_for_log(['adb', 'shell'], shell_args)}", "yellow")
+        result = session.run(" ".join(shell_args), timeout)
+        if result is None and timeout is not None:
+            # A bounded command (e.g. a hierarchy dump) hit its deadline and the session was closed under it.
+            # The device is usually still fine, so start a fresh session rather than dropping it for the rest of the run.
+            print_with_color("Command exceeded its timeout in the adb shell session. Restarting the session.", "yellow")
+            if self.shell_session is session:
+                self.shell_session = None
+                self._start_shell_session()
+            return "ERROR", ADB_TIMEOUT_ERROR # The command hung; do not re-run it through the fallback path
+        if result is None:
+            print_with_color("Persistent adb shell session died. Falling back to one-shot adb commands.", "red")
+            if self.shell_session is session: # Another capture thread may already have dropped or replaced it
+                self.shell_session = None
+            if not _is_idempotent_shell_command(" ".join(shell_args)):
+                # It may already have run (a tap or key event would then happen twice), so report instead of retrying
+                return "ERROR", "adb shell session died while running the command; not re-running it"
+            return None
+        stdout, stderr, exit_code = result
+        if exit_code != 0:
+            print_with_color(f"Command failed (exit code {exit_code}): {_format_command_for_log(['adb', 'shell'], shell_args)}", "red")
+            if stderr:
+                print_with_color(f"Stderr: {stderr.strip()}", "red")
+            return "ERROR", stderr.strip() if stderr else "Unknown ADB error"
+        return stdout.strip(), None
+
+    def _execute_command(self, command_args: list, timeout=None):
         """Helper to execute commands for this specific device."""
-        return _run_adb_command_base(self.device, command_args)
+        session = self.shell_session # Read once: the other capture thread may drop the session concurrently
+        if session is not None and len(command_args) > 1 and command_args[0] == "shell":
+            result = self._run_in_shell_session(session, command_args[1:], timeout)
+            if result is not None:
+                return result
+        return _run_adb_command_base(self.device, command_args, timeout)
+
+    def apply_device_profile(self, disable_suggestions=False) -> bool:
+        """
+        Puts the device into a fast, deterministic state for the run: window/transition/animator animations off and
+        the screen kept awake while plugged in; with `disable_suggestions`, the system spell checker (which feeds the
+        keyboard suggestion strip) is turned off as well. The previous values are saved for restore_device_profile.
+        """
+        profile = [("global", "window_animation_scale", "0"),
+                   ("global", "transition_animation_scale", "0"),
+                   ("global", "animator_duration_scale", "0"),
+                   ("global", "stay_on_while_plugged_in", "7")] # AC | USB | wireless
+        if disable_suggestions:
+            profile.append(("secure", "spell_checker_enabled", "0"))
+
+        # One round trip to read every original value, one to apply the profile
+        stdout, err = self._execute_command(["shell", " ; ".join(f"settings get {ns} {key}" for ns, key, _ in profile)])
+        originals = stdout.splitlines() if not err else []
+        if len(originals) != len(profile):
+            print_with_color(f"Could not read current device settings; device profile not applied. Error: {err}", "red")
+            return False
+        _, err = self._execute_command(["shell", " && ".join(f"settings put {ns} {key} {value}" for ns, key, value in profile)])
+        if err:
+            print_with_color(f"Error applying device profile: {err}", "red")
+        self._saved_settings.extend((ns, key, original.strip()) for (ns, key, _), original in zip(profile, originals))
+        print_with_color("Device profile applied: animations off, stay awake while plugged in"
+                         + (", spell checker off" if disable_suggestions else "") + ".", "green")
+        return not err
+
+    def enable_adb_keyboard(self, warn_if_missing=True) -> bool:
+        """
+        Makes ADBKeyBoard the active input method if it is installed, so text() can send whole strings in one
+        broadcast. The previous input method is saved with the device profile and restored by restore_device_profile.
+        """
+        stdout, err = self._execute_command(["shell", "ime list -a -s ; settings get secure default_input_method"])
+        lines = [line.strip() for line in stdout.splitlines()] if not err else []
+        if not lines:
+            print_with_color(f"Could not list input methods; using `input text`. Error: {err}", "yellow")
+            return False
+        current_ime, installed = lines[-1], lines[:-1]
+        if current_ime == ADB_KEYBOARD_IME:
+            return True
+        if ADB_KEYBOARD_IME not in installed:
+            if warn_if_missing:
+                print_with_color(f"ADBKeyBoard ({ADB_KEYBOARD_IME}) is not installed; using `input text`.", "yellow")
+            return False
+        _, err = self._execute_command(["shell", f"ime enable {ADB_KEYBOARD_IME} && ime set {ADB_KEYBOARD_IME}"])
+        if err:
+            print_with_color(f"Could not switch to ADBKeyBoard; using `input text`. Error: {err}", "yellow")
+            return False
+        self._saved_settings.append(("secure", "default_input_method", current_ime))
+        print_with_color("ADBKeyBoard enabled for text input.", "green")
+        return True
+
+    def restore_device_profile(self):
+        """
+        Restores the settings changed by apply_device_profile and enable_adb_keyboard (values that were unset are
+        deleted again).
+        """
+        if not self._saved_settings:
+            return
+        _, err = self._execute_command(["shell", _settings_restore_command(self._saved_settings)])
+        if err:
+            print_with_color(f"Error restoring device settings: {err}", "red")
+        else:
+            print_with_color("Device settings restored.", "green")
+        self._saved_settings = []
+        self.ime_text_input = False
+
+    @property
+    def saved_settings(self):
+        """(namespace, key, original value) of every setting changed for this run; see restore_saved_settings."""
+        return list(self._saved_settings)
+
+    def close(self):
+        """Releases long-lived resources held by the controller (e.g. the persistent shell session)."""
+        self.restore_device_profile() # No-op if already restored
+        if self._capture_pool is not None:
+            self._capture_pool.shutdown(wait=True)
+            self._capture_pool = None
+        if self.shell_session is not None:
+            self.shell_session.close()
+            self.shell_session = None
+        self.stop_logcat_monitor()
+
+    def start_logcat_monitor(self, package_name: str) -> bool:
+        """Starts a background logcat reader reporting crashes and ANRs of `package_name` (see LogcatMonitor)."""
+        if self.logcat_monitor is not None:
+            self.logcat_monitor.stop()
+        monitor = LogcatMonitor(self.device, package_name)
+        if not monitor.start():
+            return False
+        self.logcat_monitor = monitor
+        print_with_color(f"Logcat monitor watching {package_name} for crashes and ANRs.", "green")
+        return True
+
+    def stop_logcat_monitor(self):
+        if self.logcat_monitor is not None:
+            self.logcat_monitor.stop()
+            self.logcat_monitor = None
+
+    def poll_app_events(self):
+        """Crash/ANR events reported since the last call (empty when no monitor is running)."""
+        return self.logcat_monitor.poll_events() if self.logcat_monitor is not None else []
     
-    def launch_app(self, package_name: str):
+    def launch_app(self, package_name: str, mode=None):
         """
         Launches the specified application on the device.
-        Uses 'monkey' as it's generally reliable for starting the main launcher activity.
+        LAUNCH_MODE (or `mode`) selects how:
+          'monkey' - fire the launcher intent via monkey and return immediately (no readiness information)
+          'am'     - resolve the launcher activity and start it with `am start -W`, which blocks until the first
+                     frame is drawn and reports the launch state and time; falls back to 'poll' if that fails
+          'poll'   - monkey, then poll the resumed activity until it belongs to `package_name`
+        With 'am'/'poll' the measured start is stored in last_launch_time_ms / last_launch_state
+        (COLD, WARM, HOT, or None when the device does not report it).
         """
+        mode = str(mode or configs.get("LAUNCH_MODE", "am")).lower()
+        self.last_launch_time_ms, self.last_launch_state = None, None
+        if mode == "am":
+            if self._launch_with_am(package_name):
+                return True
+            print_with_color("'am start -W' launch failed; falling back to monkey with resumed-activity polling.", "yellow")
+            mode = "poll"
+
         print_with_color(f"Attempting to launch app: {package_name}", "yellow")
+        launch_started = time.monotonic()
         stdout, err = self._execute_command(["shell", "monkey", "-p", package_name, "-c", "android.intent.category.LAUNCHER", "1"])
 
         if err:
@@ -218,9 +729,68 @@ class AndroidController:
             if "Error: Can't find package" in err or "aborted" in err.lower():
                 print_with_color(f"Package '{package_name}' might not be installed on the device.", "red")
             return False 
+
+        if mode == "poll":
+            try:
+                launch_timeout = float(configs.get("LAUNCH_TIMEOUT", 20))
+            except ValueError:
+                launch_timeout = 20.0
+            while time.monotonic() - launch_started < launch_timeout:
+                resumed = self.get_resumed_activity()
+                if resumed and resumed.split("/")[0] == package_name:
+                    self.last_launch_time_ms = int((time.monotonic() - launch_started) * 1000)
+                    print_with_color(f"App {package_name} resumed ({resumed}) after {self.last_launch_time_ms} ms.", "green")
+                    return True
+                time.sleep(0.2)
+            print_with_color(f"App {package_name} did not reach the foreground within {launch_timeout}s.", "yellow")
+            return True # The launch itself was sent; the caller's settle wait covers slow starts
         
         print_with_color(f"App {package_name} launch command sent. Assuming success if no error reported.", "green")
         return True
+
+    def resolve_launch_activity(self, package_name: str):
+        """Returns the launcher component ("pkg/.MainActivity") of `package_name`, or None if it cannot be resolved."""
+        stdout, err = self._execute_command(["shell", "cmd", "package", "resolve-activity", "--brief",
+                                             "-c", "android.intent.category.LAUNCHER", package_name])
+        if err or not stdout:
+            return None
+        component = stdout.strip().splitlines()[-1].strip()
+        return component if "/" in component else None
+
+    def _launch_with_am(self, package_name: str) -> bool:
+        component = self.resolve_launch_activity(package_name)
+        if not component:
+            print_with_color(f"Could not resolve the launcher activity of {package_name}.", "yellow")
+            return False
+        print_with_color(f"Attempting to launch app: {component} (am start -W)", "yellow")
+        stdout, err = self._execute_command(["shell", "am", "start", "-W", "-a", "android.intent.action.MAIN",
+                                             "-c", "android.intent.category.LAUNCHER", "-n", component])
+        if err or not stdout or "Error" in stdout:
+            print_with_color(f"am start failed for {component}: {err or stdout}", "red")
+            return False
+        # Output lines such as "LaunchState: COLD", "TotalTime: 512", "WaitTime: 530" (older releases omit some)
+        fields = dict(line.split(":", 1) for line in stdout.splitlines() if ":" in line)
+        fields = {key.strip(): value.strip() for key, value in fields.items()}
+        for key in ("TotalTime", "WaitTime", "ThisTime"):
+            if fields.get(key, "").isdigit():
+                self.last_launch_time_ms = int(fields[key])
+                break
+        self.last_launch_state = fields.get("LaunchState") or None
+        print_with_color(f"App {package_name} launched ({self.last_launch_state or 'launch state unknown'}) "
+                         f"in {self.last_launch_time_ms if self.last_launch_time_ms is not None else '?'} ms.", "green")
+        return True
+
+    def get_resumed_activity(self):
+        """Returns the resumed (foreground) activity as "pkg/.Activity", or None."""
+        stdout, err = self._execute_command(["shell", "dumpsys", "activity", "activities", "|",
+                                             "grep", "-E", "'mResumedActivity|topResumedActivity'"])
+        if err or not stdout:
+            return None
+        # e.g. "    mResumedActivity: ActivityRecord{8c2 u0 com.app/.MainActivity t42}"
+        for token in stdout.strip().splitlines()[0].split():
+            if "/" in token:
+                return token.rstrip("}")
+        return None
     
     def close_app(self, package_name: str) -> bool:
         """
@@ -259,6 +829,20 @@ class AndroidController:
         device_file_name = prefix + '.png'
         device_file_path = os.path.join(self.device_screenshot_dir, device_file_name).replace("\\", "/")
         local_file_path = os.path.join(local_save_dir, device_file_name)
+
+        mode = str(configs.get("SCREENSHOT_MODE", "pull")).lower()
+        if mode == "exec-out":
+            png_bytes, err = _run_adb_binary_base(self.device, ["exec-out", "screencap", "-p"])
+            if err or not png_bytes:
+                return "ERROR"
+            with open(local_file_path, "wb") as f_png:
+                f_png.write(png_bytes)
+            return local_file_path
+        if mode == "raw":
+            img = self._capture_raw_frame()
+            if img is None or not cv2.imwrite(local_file_path, to_bgr(img)):
+                return "ERROR"
+            return local_file_path
         
         _, err_cap = self._execute_command(["shell", "screencap", "-p", device_file_path])
         if err_cap:
@@ -271,13 +855,61 @@ class AndroidController:
             return "ERROR"
         return local_file_path
 
-    def get_xml(self, prefix, local_save_dir):
+    def _capture_raw_frame(self):
+        """Streams the unencoded framebuffer over exec-out; returns a zero-copy RGBA view or None."""
+        raw_bytes, err = _run_adb_binary_base(self.device, ["exec-out", "screencap"])
+        if err or not raw_bytes:
+            return None
+        return parse_raw_screencap(raw_bytes)
+
+    def get_screenshot_image(self, prefix=None, local_save_dir=None):
+        """
+        Captures the screen and returns it as an image array (None on failure).
+        With SCREENSHOT_MODE 'exec-out' the PNG is streamed straight into memory in one round trip, with no file
+        written on the device; it is only written to disk when `local_save_dir` is given.
+        With 'raw' the device skips PNG compression entirely and the result is a read-only RGBA framebuffer view
+        (4 channels) that draw_bbox_multi and the model encoders accept as-is.
+        With the default 'pull' mode this falls back to get_screenshot and reads the pulled file.
+        """
+        mode = str(configs.get("SCREENSHOT_MODE", "pull")).lower()
+        if mode == "raw":
+            img = self._capture_raw_frame()
+            if img is not None and local_save_dir:
+                os.makedirs(local_save_dir, exist_ok=True)
+                cv2.imwrite(os.path.join(local_save_dir, (prefix or "screenshot") + ".png"), to_bgr(img))
+            return img
+        if mode == "exec-out":
+            png_bytes, err = _run_adb_binary_base(self.device, ["exec-out", "screencap", "-p"])
+            if err or not png_bytes:
+                return None
+            img = cv2.imdecode(np.frombuffer(png_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if img is None:
+                print_with_color("Could not decode screencap output from exec-out stream.", "red")
+                return None
+            if local_save_dir:
+                os.makedirs(local_save_dir, exist_ok=True)
+                with open(os.path.join(local_save_dir, (prefix or "screenshot") + ".png"), "wb") as f_png:
+                    f_png.write(png_bytes) # Already PNG-encoded by the device, no re-encode needed
+            return img
+
+        if local_save_dir:
+            local_file_path = self.get_screenshot(prefix or "screenshot", local_save_dir)
+            return None if local_file_path == "ERROR" else cv2.imread(local_file_path)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            local_file_path = self.get_screenshot(prefix or "screenshot", tmp_dir)
+            return None if local_file_path == "ERROR" else cv2.imread(local_file_path)
+
+    def get_xml(self, prefix, local_save_dir, timeout=None, compressed=False):
         os.makedirs(local_save_dir, exist_ok=True)
         device_file_name = prefix + '.xml'
         device_file_path = os.path.join(self.device_xml_dir, device_file_name).replace("\\", "/")
         local_file_path = os.path.join(local_save_dir, device_file_name)
 
-        _, err_dump = self._execute_command(["shell", "uiautomator", "dump", device_file_path])
+        dump_args = ["shell", "uiautomator", "dump"] + (["--compressed"] if compressed else []) + [device_file_path]
+        _, err_dump = self._execute_command(dump_args, timeout=timeout)
+        if err_dump == ADB_TIMEOUT_ERROR:
+            print_with_color(f"UI hierarchy dump exceeded {timeout}s deadline. Hierarchy unavailable for this capture.", "yellow")
+            return HIERARCHY_UNAVAILABLE
         if err_dump:
             self._execute_command(["shell", "ls", "-ld", self.device_xml_dir])
             return "ERROR"
@@ -287,13 +919,154 @@ class AndroidController:
             return "ERROR"
         return local_file_path
 
+    def get_hierarchy(self, prefix=None, local_save_dir=None):
+        """
+        Captures the UI hierarchy and returns the XML as bytes, ready for traverse_tree without touching disk.
+        Returns HIERARCHY_UNAVAILABLE if the dump misses its XML_DUMP_TIMEOUT deadline (uiautomator waits for the UI
+        to go idle, which can take seconds on animated screens), or "ERROR" on any other failure.
+        XML_DUMP_MODE 'stream' dumps to /dev/tty over exec-out in one round trip; 'pull' uses get_xml.
+        XML_DUMP_COMPRESSED adds --compressed (drops layout-only nodes, so dumps are smaller and faster).
+        The XML is also written to `local_save_dir` when one is given.
+        """
+        try:
+            timeout = float(configs.get("XML_DUMP_TIMEOUT", 10))
+        except ValueError:
+            timeout = 10.0
+        compressed = str(configs.get("XML_DUMP_COMPRESSED", "false")).lower() == 'true'
+        mode = str(configs.get("XML_DUMP_MODE", "pull")).lower()
+
+        if mode == "stream":
+            dump_cmd = ["exec-out", "uiautomator", "dump"] + (["--compressed"] if compressed else []) + ["/dev/tty"]
+            raw_bytes, err = _run_adb_binary_base(self.device, dump_cmd, timeout=timeout)
+            if err == ADB_TIMEOUT_ERROR:
+                print_with_color(f"UI hierarchy dump exceeded {timeout}s deadline. Hierarchy unavailable for this capture.", "yellow")
+                return HIERARCHY_UNAVAILABLE
+            # Output is the XML followed by uiautomator's "UI hierchary dumped to: /dev/tty" trailer
+            start, end = raw_bytes.find(b"<?xml"), raw_bytes.rfind(b"</hierarchy>")
+            if err or start == -1 or end == -1:
+                print_with_color(f"Could not read streamed UI hierarchy. Error: {err if err else 'no XML in output'}", "red")
+                return "ERROR"
+            xml_bytes = raw_bytes[start:end + len(b"</hierarchy>")]
+            if local_save_dir:
+                os.makedirs(local_save_dir, exist_ok=True)
+                with open(os.path.join(local_save_dir, (prefix or "hierarchy") + ".xml"), "wb") as f_xml:
+                    f_xml.write(xml_bytes)
+            return xml_bytes
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            xml_path = self.get_xml(prefix or "hierarchy", local_save_dir or tmp_dir, timeout=timeout, compressed=compressed)
+            if xml_path in ("ERROR", HIERARCHY_UNAVAILABLE):
+                return xml_path
+            with open(xml_path, "rb") as f_xml:
+                return f_xml.read()
+
+    def capture_state(self, prefix, screenshot_dir=None, xml_dir=None):
+        """
+        Fetches the screenshot and the UI hierarchy concurrently (both are I/O-bound waits on the device) and
+        returns them as a CaptureState. Arguments are passed through to get_screenshot_image / get_hierarchy.
+        With ADB_SHELL_SESSION on, shell commands share the one session and run one at a time, so the two captures
+        only overlap when at least one of them uses its own exec-out channel (SCREENSHOT_MODE exec-out/raw or
+        XML_DUMP_MODE stream); with both in 'pull' mode they are serialized.
+        """
+        if self._capture_pool is None:
+            self._capture_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="capture")
+
+        def timed(func, *args):
+            result = func(*args)
+            return result, time.time()
+
+        screenshot_future = self._capture_pool.submit(timed, self.get_screenshot_image, prefix, screenshot_dir)
+        hierarchy_future = self._capture_pool.submit(timed, self.get_hierarchy, prefix, xml_dir)
+        screenshot, screenshot_time = screenshot_future.result()
+        hierarchy, hierarchy_time = hierarchy_future.result()
+        return CaptureState(screenshot, hierarchy, screenshot_time, hierarchy_time)
+
+    # --- UI settle detection ---
+    def get_window_focus(self):
+        """Returns the focused window as reported by dumpsys (e.g. "com.app/com.app.MainActivity"), or None."""
+        stdout, err = self._execute_command(["shell", "dumpsys", "window", "|", "grep", "mCurrentFocus"])
+        if err or not stdout:
+            return None
+        # e.g. "  mCurrentFocus=Window{4f1c2d u0 com.app/com.app.MainActivity}"
+        line = stdout.strip().splitlines()[-1]
+        return line.rstrip("}").split(" ")[-1] if "{" in line else line.split("=", 1)[-1]
+
+    def get_focused_package(self):
+        """
+        Package owning the focused activity window (runs through the shell session when one is active), or None when
+        that cannot be told from the focus: nothing focused (e.g. mid-transition) or a non-activity window such as
+        "PopupWindow:3f2a1b", "NotificationShade" or "StatusBar", which carries no package name.
+        """
+        focus = self.get_window_focus()
+        if not focus or "/" not in focus:
+            return None
+        return focus.split("/")[0]
+
+    def _frame_signature(self):
+        """Hash of a 32x32 grayscale thumbnail of the raw framebuffer, coarsely quantized so noise is ignored."""
+        frame = self._capture_raw_frame()
+        if frame is None:
+            return None
+        thumb = cv2.resize(cv2.cvtColor(frame, cv2.COLOR_RGBA2GRAY), (32, 32), interpolation=cv2.INTER_AREA)
+        return hashlib.sha1((thumb >> 4).tobytes()).hexdigest()
+
+    def _hierarchy_signature(self):
+        xml_bytes = self.get_hierarchy()
+        if not isinstance(xml_bytes, bytes):
+            return None
+        return hashlib.sha1(xml_bytes).hexdigest()
+
+    def wait_for_settle(self, timeout=None, poll_interval=None, stable_polls=None, signals=None):
+        """
+        Polls cheap UI signals until they stop changing, instead of sleeping a fixed interval after an action.
+        signals: subset of "focus" (focused window; one small dumpsys per poll), "frame" (downscaled framebuffer hash;
+        catches in-window changes but pulls the full raw framebuffer, width*height*4 bytes or ~10 MB on a 1440p
+        screen, every poll) and "hierarchy" (UI dump hash; accurate but slow); defaults to SETTLE_SIGNALS, which
+        defaults to "focus". The UI counts as settled once `stable_polls`
+        consecutive samples match the previous one. Gives up after `timeout` seconds (SETTLE_TIMEOUT).
+        Returns the seconds waited, or None if none of the signals could be read (callers then fall back to a
+        fixed delay).
+        """
+        def config_float(key, default):
+            try:
+                return float(configs.get(key, default))
+            except ValueError:
+                return default
+        timeout = config_float("SETTLE_TIMEOUT", 10.0) if timeout is None else timeout
+        poll_interval = config_float("SETTLE_POLL_INTERVAL", 0.2) if poll_interval is None else poll_interval
+        stable_polls = int(config_float("SETTLE_STABLE_POLLS", 2)) if stable_polls is None else stable_polls
+        if signals is None:
+            signals = [sig.strip() for sig in str(configs.get("SETTLE_SIGNALS", "focus")).split(",") if sig.strip()]
+        samplers = {"frame": self._frame_signature, "focus": self.get_window_focus, "hierarchy": self._hierarchy_signature}
+        active = [samplers[sig] for sig in signals if sig in samplers]
+
+        start = time.monotonic()
+        previous, stable = None, 0
+        while True:
+            sample = tuple(sampler() for sampler in active)
+            elapsed = time.monotonic() - start
+            if not any(value is not None for value in sample):
+                return None # No signal could be read (e.g. raw screencap unsupported)
+            stable = stable + 1 if sample == previous else 0
+            if stable >= stable_polls:
+                return elapsed
+            if elapsed >= timeout:
+                print_with_color(f"UI did not settle within {timeout}s; continuing anyway.", "yellow")
+                return elapsed
+            previous = sample
+            time.sleep(poll_interval)
+
     def tap(self, x, y):
         return self._execute_command(["shell", "input", "tap", str(x), str(y)])[0]
 
     def text(self, input_str):
-        escaped_str = input_str.replace(' ', '%s')
-        escaped_str = escaped_str.replace("'", "'\\''") 
-        return self._execute_command(["shell", "input", "text", escaped_str])[0]
+        """
+        Types input_str into the focused field in one call, through ADBKeyBoard when enabled and still the active input
+        method, else `input text` (the fallback happens on the device, see _text_command).
+        """
+        if not self.ime_text_input and not input_str.isascii():
+            print_with_color("`input text` cannot type non-ASCII characters; install ADBKeyBoard for Unicode text.", "yellow")
+        return self._execute_command(["shell", _text_command(input_str, self.ime_text_input)])[0]
 
     def long_press(self, x, y, duration=1000):
         return self._execute_command(["shell", "input", "swipe", str(x), str(y), str(x), str(y), str(duration)])[0]
@@ -386,6 +1159,41 @@ class AndroidController:
         
         return self.swipe_precise((start_x, start_y), (end_x, end_y), duration_ms)
 
+    def scroll_until_found(self, text=None, resource_id=None, content_desc=None, direction="up", max_swipes=None,
+                           distance_factor=0.5):
+        """
+        Swipes the screen in `direction` (as in swipe_screen_direction) until a node matching find_node's criteria is
+        on screen, without a screenshot or model call per swipe. Stops early at the end of the list, i.e. when a
+        swipe leaves the UI hierarchy unchanged. max_swipes defaults to SCROLL_MAX_SWIPES. Returns a ScrollResult.
+        """
+        if max_swipes is None:
+            try:
+                max_swipes = int(configs.get("SCROLL_MAX_SWIPES", 10))
+            except ValueError:
+                max_swipes = 10
+        hierarchy = self.get_hierarchy()
+        swipes = 0
+        while True:
+            if hierarchy in ("ERROR", HIERARCHY_UNAVAILABLE):
+                return ScrollResult(None, swipes, "error")
+            bounds = find_node(hierarchy, text, resource_id, content_desc)
+            if bounds is not None:
+                return ScrollResult(bounds, swipes, "found")
+            if swipes >= max_swipes:
+                return ScrollResult(None, swipes, "max_swipes")
+            # A slow swipe scrolls by about its own length; a fast one flings and can skip past the target
+            if self.swipe_screen_direction(direction, distance_factor, duration_ms=600) == "ERROR":
+                return ScrollResult(None, swipes, "error")
+            swipes += 1
+            if self.wait_for_settle() is None:
+                time.sleep(0.5)
+            previous, hierarchy = hierarchy, self.get_hierarchy()
+            if hierarchy in ("ERROR", HIERARCHY_UNAVAILABLE):
+                continue
+            ui_change = diff_hierarchies(previous, hierarchy)
+            if ui_change is not None and ui_change.is_unchanged():
+                return ScrollResult(None, swipes, "end_of_list")
+
     # --- Keyevent Methods ---
     def press_keyevent(self, keycode):
         return self._execute_command(["shell", "input", "keyevent", str(keycode)])[0]
@@ -436,7 +1244,16 @@ class AndroidController:
         return self._execute_command(["shell", "cmd", "statusbar", "collapse"])[0]
     
     def delete_multiple(self, count: int):
-        for _ in range(count):
-            self.press_delete()
-            time.sleep(0.1) # Small delay between deletes if needed
+        if count <= 0:
+            return "OK"
+        return self.run_input_batch(InputBatch().keyevent(*[67] * count))
+
+    def run_input_batch(self, batch: InputBatch):
+        """Runs every primitive of `batch` in one device round trip. Returns "OK", or "ERROR" if any step failed."""
+        if not len(batch):
+            return "OK"
+        stdout, err = self._execute_command(["shell", batch.compile(self.ime_text_input)])
+        if err or stdout == "ERROR":
+            print_with_color(f"Input batch failed: {err}", "red")
+            return "ERROR"
         return "OK"
\ No newline at end of file
@@ -0,0 +1,121 @@
+import sys
+
+import numpy as np
+
+# Attribute and role-hint bit flags stored per element in ElementTable.flags
+FLAG_CLICKABLE = 1 << 0
+FLAG_FOCUSABLE = 1 << 1
+FLAG_SEARCH_BAR = 1 << 2
+FLAG_NAV_ITEM = 1 << 3
+FLAG_NAV_BAR_CONTAINER = 1 << 4
+
+ROLE_FLAGS = {
+    "search_bar": FLAG_SEARCH_BAR,
+    "nav_item": FLAG_NAV_ITEM,
+    "nav_bar_container": FLAG_NAV_BAR_CONTAINER,
+}
+
+
+class ElementTable:
+    """
+    Columnar store for the labeled elements of one screen.
+    bounds is an (N, 4) int32 array of [x1, y1, x2, y2], centers an (N, 2) int32 array computed once, flags an (N,)
+    uint8 array of FLAG_* bits and uids a list of interned strings. Element labels are 1-based, matching the numbers
+    drawn on the screenshot and returned by the VLM; row i holds label i + 1.
+    """
+
+    def __init__(self, uids=(), bounds=None, flags=None):
+        self.uids = [sys.intern(uid) for uid in uids]
+        self.bounds = np.asarray(bounds if bounds is not None else [], dtype=np.int32).reshape(-1, 4)
+        self.flags = np.asarray(flags if flags is not None else [], dtype=np.uint8).reshape(-1)
+        if not (len(self.uids) == len(self.bounds) == len(self.flags)):
+            raise ValueError(f"ElementTable columns differ in length: {len(self.uids)} uids, "
+                             f"{len(self.bounds)} bounds, {len(self.flags)} flags")
+        self.centers = (self.bounds[:, :2] + self.bounds[:, 2:]) // 2
+
+    @classmethod
+    def from_elements(cls, elem_list):
+        """Builds a table from AndroidElement objects (e.g. the output of extract_elements), keeping their order."""
+        uids, bounds, flags = [], [], []
+        for elem in elem_list:
+            (x1, y1), (x2, y2) = elem.bbox
+            bits = (FLAG_CLICKABLE if elem.clickable else 0) | (FLAG_FOCUSABLE if elem.focusable else 0)
+            for hint in elem.role_hints:
+                bits |= ROLE_FLAGS.get(hint, 0)
+            uids.append(elem.uid)
+            bounds.append((x1, y1, x2, y2))
+            flags.append(bits)
+        return cls(uids, bounds, flags)
+
+    def __len__(self):
+        return len(self.uids)
+
+    def has_label(self, label):
+        return isinstance(label, (int, np.integer)) and 1 <= label <= len(self.uids)
+
+    # --- Label-based accessors (1-based) ---
+    def uid(self, label):
+        return self.uids[label - 1]
+
+    def label_of(self, uid):
+        """Label of the first element with `uid`, or None if it is not on this screen."""
+        try:
+            return self.uids.index(uid) + 1
+        except ValueError:
+            return None
+
+    def labels_of(self, uid):
+        """Labels of every element with `uid`, in screen order (rows of a list of identical items share a uid)."""
+        return [i + 1 for i, row_uid in enumerate(self.uids) if row_uid == uid]
+
+    def occurrence(self, label):
+        """Position of `label` among the elements sharing its uid (0 for the first), see labels_of."""
+        return self.labels_of(self.uid(label)).index(label)
+
+    def center(self, label):
+        x, y = self.centers[label - 1]
+        return int(x), int(y)
+
+    def bbox(self, label):
+        x1, y1, x2, y2 = (int(v) for v in self.bounds[label - 1])
+        return (x1, y1), (x2, y2)
+
+    def has_flag(self, label, flag):
+        return bool(self.flags[label - 1] & flag)
+
+    def attrib(self, label):
+        """Comma-joined summary such as "clickable,search_bar", in the same form as AndroidElement.attrib."""
+        bits = int(self.flags[label - 1])
+        names = [name for name, flag in (("clickable", FLAG_CLICKABLE), ("focusable", FLAG_FOCUSABLE)) if bits & flag]
+        names += [name for name, flag in ROLE_FLAGS.items() if bits & flag]
+        return ",".join(names)
+
+    # --- Vectorized queries (all return 1-based labels) ---
+    def hit_test(self, x, y):
+        """Labels of elements whose bounds contain (x, y), innermost (smallest area) first."""
+        b = self.bounds
+        inside = np.flatnonzero((b[:, 0] <= x) & (x <= b[:, 2]) & (b[:, 1] <= y) & (y <= b[:, 3]))
+        if inside.size == 0:
+            return []
+        areas = (b[inside, 2] - b[inside, 0]).astype(np.int64) * (b[inside, 3] - b[inside, 1])
+        return [int(i) + 1 for i in inside[np.argsort(areas, kind="stable")]]
+
+    def filter(self, flag, exclude=0):
+        """Labels of elements with every bit of `flag` set and no bit of `exclude` set."""
+        mask = ((self.flags & flag) == flag) & ((self.flags & exclude) == 0)
+        return [int(i) + 1 for i in np.flatnonzero(mask)]
+
+    def nearest(self, x, y, flag=0):
+        """Label of the element whose center is closest to (x, y), optionally restricted to `flag`; None if empty."""
+        candidates = np.flatnonzero((self.flags & flag) == flag)
+        if candidates.size == 0:
+            return None
+        deltas = self.centers[candidates].astype(np.int64) - (x, y)
+        return int(candidates[np.argmin(np.einsum("ij,ij->i", deltas, deltas))]) + 1
+
+    def without_uids(self, uids):
+        """New table without the elements whose uid is in `uids`; remaining elements are relabeled in order."""
+        if not uids:
+            return self
+        keep = [i for i, uid in enumerate(self.uids) if uid not in uids]
+        return ElementTable([self.uids[i] for i in keep], self.bounds[keep], self.flags[keep])
@@ -0,0 +1,248 @@
+"""
+Local stand-in for the adb server, speaking the same host protocol as AdbWireClient.
+Lets the wire backend (and anything built on AndroidController) be exercised without a device or the adb binary:
+
+    server = FakeAdbServer(shell_responses={"wm size": "Physical size: 1080x1920\\n"})
+    port = server.start()
+    # ADB_BACKEND=wire ADB_SERVER_PORT=<port> python -m scripts.self_explorer ...
+    server.stop()
+
+Run `python -m scripts.fake_adb_server [port]` to keep one running in the foreground.
+"""
+import socketserver
+import struct
+import sys
+import threading
+import time
+
+from .utils import print_with_color
+
+
+class _FakeAdbHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        fake = self.server.fake
+        sock = self.request
+        serial = None
+        try:
+            while True:
+                request = self._read_request(sock)
+                if request is None:
+                    return
+                fake.requests.append((serial, request))
+
+                if request == "host:version":
+                    self._okay_with_payload(sock, b"0029")
+                    return
+                if request in ("host:devices", "host:devices-l"):
+                    listing = "".join(f"{s}\t{state}\n" for s, state in fake.devices.items())
+                    self._okay_with_payload(sock, listing.encode("utf-8"))
+                    return
+                if request.startswith("host:transport"):
+                    serial = self._select_transport(request)
+                    if serial is None:
+                        return
+                    sock.sendall(b"OKAY")
+                    continue
+
+                if serial is None:
+                    self._fail(sock, f"unknown host service '{request}'")
+                    return
+                if request.startswith("shell,v2"):
+                    self._serve_shell_v2(sock, serial, request.split(":", 1)[1])
+                elif request.startswith("shell:"):
+                    stdout, stderr, _ = fake.run_shell(serial, request[len("shell:"):])
+                    sock.sendall(b"OKAY" + stdout + stderr)
+                elif request.startswith("exec:"):
+                    sock.sendall(b"OKAY" + fake.run_exec(serial, request[len("exec:"):]))
+                elif request == "sync:":
+                    sock.sendall(b"OKAY")
+                    self._serve_sync(sock, serial)
+                else:
+                    self._fail(sock, f"unknown device service '{request}'")
+                return
+        except (ConnectionError, OSError):
+            return
+
+    # --- Framing helpers ---
+    @staticmethod
+    def _recv_exact(sock, n):
+        buf = bytearray()
+        while len(buf) < n:
+            chunk = sock.recv(n - len(buf))
+            if not chunk:
+                return None
+            buf.extend(chunk)
+        return bytes(buf)
+
+    def _read_request(self, sock):
+        header = self._recv_exact(sock, 4)
+        if header is None:
+            return None
+        payload = self._recv_exact(sock, int(header, 16))
+        return payload.decode("utf-8") if payload is not None else None
+
+    @staticmethod
+    def _okay_with_payload(sock, payload: bytes):
+        sock.sendall(b"OKAY" + b"%04x" % len(payload) + payload)
+
+    @staticmethod
+    def _fail(sock, message: str):
+        data = message.encode("utf-8")
+        sock.sendall(b"FAIL" + b"%04x" % len(data) + data)
+
+    def _select_transport(self, request):
+        devices = self.server.fake.devices
+        online = [s for s, state in devices.items() if state == "device"]
+        if request == "host:transport-any":
+            if len(online) != 1:
+                self._fail(self.request, "more than one device/emulator" if online else "no devices/emulators found")
+                return None
+            return online[0]
+        serial = request[len("host:transport:"):]
+        if devices.get(serial) != "device":
+            self._fail(self.request, f"device '{serial}' not found")
+            return None
+        return serial
+
+    # --- Services ---
+    def _serve_shell_v2(self, sock, serial, command):
+        fake = self.server.fake
+        if not fake.shell_v2:
+            self._fail(sock, "closed")
+            return
+        stdout, stderr, exit_code = fake.run_shell(serial, command)
+        packets = b"OKAY"
+        if stdout:
+            packets += struct.pack("<BI", 1, len(stdout)) + stdout
+        if stderr:
+            packets += struct.pack("<BI", 2, len(stderr)) + stderr
+        packets += struct.pack("<BI", 3, 1) + bytes([exit_code & 0xFF])
+        sock.sendall(packets)
+
+    def _serve_sync(self, sock, serial):
+        files = self.server.fake.files
+        while True:
+            header = self._recv_exact(sock, 8)
+            if header is None:
+                return
+            kind, length = header[:4], struct.unpack("<I", header[4:])[0]
+            if kind == b"QUIT":
+                return
+            if kind == b"RECV":
+                path = self._recv_exact(sock, length).decode("utf-8")
+                data = files.get((serial, path))
+                if data is None:
+                    message = b"No such file or directory"
+                    sock.sendall(b"FAIL" + struct.pack("<I", len(message)) + message)
+                    continue
+                for offset in range(0, len(data), 64 * 1024):
+                    chunk = data[offset:offset + 64 * 1024]
+                    sock.sendall(b"DATA" + struct.pack("<I", len(chunk)) + chunk)
+                sock.sendall(b"DONE" + struct.pack("<I", 0))
+            elif kind == b"SEND":
+                path = self._recv_exact(sock, length).decode("utf-8").rsplit(",", 1)[0]
+                received = bytearray()
+                while True:
+                    chunk_header = self._recv_exact(sock, 8)
+                    if chunk_header is None:
+                        return
+                    chunk_kind, chunk_len = chunk_header[:4], struct.unpack("<I", chunk_header[4:])[0]
+                    if chunk_kind == b"DATA":
+                        received.extend(self._recv_exact(sock, chunk_len))
+                    elif chunk_kind == b"DONE":
+                        break
+                    else:
+                        return
+                files[(serial, path)] = bytes(received)
+                sock.sendall(b"OKAY" + struct.pack("<I", 0))
+            else:
+                return
+
+
+class _ThreadingTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class FakeAdbServer:
+    """
+    In-process fake adb server.
+
+    devices:          {serial: state}, e.g. {"emulator-5554": "device"}
+    shell_responses:  {command: stdout or (stdout, stderr, exit_code)} used by the default shell handler
+    exec_responses:   {command: bytes} used by the default exec: handler (e.g. canned `screencap -p` output)
+    files:            {(serial, path): bytes} backing the sync: service; pushes are stored here
+    shell_handler / exec_handler: optional callables (serial, command) overriding the canned responses
+    shell_v2:         set False to emulate a device without the shell_v2 feature
+    """
+
+    def __init__(self, devices=None, shell_responses=None, exec_responses=None, files=None,
+                 shell_handler=None, exec_handler=None, shell_v2=True, host="127.0.0.1", port=0):
+        self.devices = dict(devices) if devices is not None else {"emulator-5554": "device"}
+        self.shell_responses = dict(shell_responses or {})
+        self.exec_responses = dict(exec_responses or {})
+        self.files = dict(files or {})
+        self.shell_handler = shell_handler
+        self.exec_handler = exec_handler
+        self.shell_v2 = shell_v2
+        self.requests = [] # (serial, request) log, useful for assertions
+        self._address = (host, port)
+        self._server = None
+        self._thread = None
+
+    @property
+    def port(self):
+        return self._server.server_address[1] if self._server else None
+
+    def run_shell(self, serial, command):
+        if self.shell_handler is not None:
+            result = self.shell_handler(serial, command)
+        elif command in self.shell_responses:
+            result = self.shell_responses[command]
+        else:
+            result = ("", f"/system/bin/sh: {command.split(' ')[0]}: not found\n", 127)
+        if isinstance(result, tuple):
+            stdout, stderr, exit_code = result
+        else:
+            stdout, stderr, exit_code = result, "", 0
+        to_bytes = lambda v: v if isinstance(v, bytes) else str(v).encode("utf-8")
+        return to_bytes(stdout), to_bytes(stderr), int(exit_code)
+
+    def run_exec(self, serial, command):
+        if self.exec_handler is not None:
+            return self.exec_handler(serial, command)
+        if command in self.exec_responses:
+            return self.exec_responses[command]
+        return self.run_shell(serial, command)[0]
+
+    def start(self) -> int:
+        self._server = _ThreadingTCPServer(self._address, _FakeAdbHandler)
+        self._server.fake = self
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self.port
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+if __name__ == "__main__":
+    listen_port = int(sys.argv[1]) if len(sys.argv) > 1 else 5038
+    server = FakeAdbServer(shell_responses={"wm size": "Physical size: 1080x1920\n", "true": ""}, port=listen_port)
+    server.start()
+    print_with_color(f"Fake adb server listening on 127.0.0.1:{server.port} (Ctrl+C to stop)", "green")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,83 @@
+"""
+Long-lived agent process for one fleet device (started by workflow_manager.run_fleet). It keeps a single AgentSession,
+and with it the controller, shell session and device profile, for every job the device runs. Jobs arrive on stdin as
+JSON lines; each reply is one stdout line starting with FLEET_RESULT_PREFIX. A crash only takes down this device.
+"""
+import argparse
+import contextlib
+import json
+import os
+import signal
+import sys
+import warnings
+
+warnings.filterwarnings("ignore")
+
+# Marks reply lines on stdout; anything else printed there is log output
+FLEET_RESULT_PREFIX = "FLEET_RESULT "
+
+def main():
+    parser = argparse.ArgumentParser(description="Runs fleet jobs on one device through a single AgentSession.")
+    parser.add_argument("--device", type=str, required=True, help="Serial of the device this worker drives.")
+    parser.add_argument("--root_dir", default=".",
+                        help="Root directory for agent operations (e.g., where 'apps' folder will be).")
+    parser.add_argument("--profile_file", default=None,
+                        help="JSON file recording the device settings this process changed, removed once they are "
+                             "restored; lets the orchestrator restore them if the process has to be killed.")
+    args = parser.parse_args()
+
+    def on_sigterm(signum, frame):
+        # SystemExit passes through run_task's error handling but runs its cleanup and AgentSession.close
+        raise SystemExit(f"Terminated by signal {signum}")
+    signal.signal(signal.SIGTERM, on_sigterm)
+
+    # Imported here so workflow_manager can read FLEET_RESULT_PREFIX without loading the agent and its VLM SDKs
+    from colorama import AnsiToWin32
+    from .agent_session import AgentSession, apply_model_overrides, build_model
+    from .and_controller import list_all_devices, AndroidController
+    from .config import load_config
+    from .utils import print_with_color
+
+    reply_stream = sys.stdout
+    def reply(message):
+        reply_stream.write(FLEET_RESULT_PREFIX + json.dumps(message) + "\n")
+        reply_stream.flush()
+
+    if args.device not in list_all_devices():
+        print_with_color(f"Device {args.device} not found.", "red")
+        sys.exit(1)
+
+    configs = load_config()
+    controller = AndroidController(args.device)
+    if args.profile_file:
+        with open(args.profile_file, "w", encoding="utf-8") as f:
+            json.dump(controller.saved_settings, f)
+    session = AgentSession(configs, controller, None, args.root_dir)
+    model_key = None # (model, api_key) the session's VLM client was built for
+    try:
+        for line in sys.stdin:
+            if not line.strip():
+                continue
+            job = json.loads(line)
+            # Each job logs to its own file; AnsiToWin32 strips the colors as it would for a redirected stdout
+            with open(job["log"], "w", encoding="utf-8") as log_file:
+                log_stream = AnsiToWin32(log_file).stream
+                with contextlib.redirect_stdout(log_stream), contextlib.redirect_stderr(log_stream):
+                    if (job.get("model"), job.get("api_key")) != model_key:
+                        # The client is only rebuilt when a job asks for a different model or key
+                        model_key = (job.get("model"), job.get("api_key"))
+                        job_configs = dict(configs)
+                        ok = apply_model_overrides(job_configs, job.get("model"), job.get("api_key"))
+                        session.model = build_model(job_configs) if ok else None
+                    if session.model is None:
+                        reply({"job_id": job["id"], "status": "model_error"})
+                        continue
+                    result = session.run_task(job["app_name"], job["package_name"], job["task"])
+            reply({"job_id": job["id"], **result.to_dict()})
+    finally:
+        session.close()
+        if args.profile_file and os.path.exists(args.profile_file):
+            os.remove(args.profile_file) # Settings restored by close()
+
+if __name__ == "__main__":
+    main()
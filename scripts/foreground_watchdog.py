@@ -0,0 +1,56 @@
+from .utils import print_with_color
+
+# System UIs the agent must be able to work through itself (permission prompts, keyboard)
+DEFAULT_ALLOWED_PACKAGES = ("com.google.android.permissioncontroller", "com.android.permissioncontroller",
+                            "com.google.android.inputmethod.latin")
+
+
+class ForegroundWatchdog:
+    """
+    Per-round check that the target app still owns the focused window, with deterministic recovery.
+    policy: 'back' presses BACK (escalating to a relaunch after `max_backs` consecutive attempts), 'relaunch'
+    relaunches the app straight away, 'off' only counts. counts tracks checks, departures and recoveries.
+    """
+
+    def __init__(self, controller, package_name, policy="back", allowed_packages=DEFAULT_ALLOWED_PACKAGES, max_backs=2):
+        self.controller = controller
+        self.package_name = package_name
+        self.policy = policy
+        self.allowed_packages = set(allowed_packages) | {package_name}
+        self.max_backs = max_backs
+        self.consecutive_backs = 0
+        self.counts = {"checks": 0, "left_app": 0, "back": 0, "relaunch": 0}
+
+    def check(self, before_recovery=None):
+        """
+        Returns True if the agent had left the app and a recovery action was taken (the screen has changed).
+        before_recovery, if given, is called right before the recovery action, e.g. to settle pending work that
+        would otherwise act on the recovered screen.
+        """
+        if self.policy == "off":
+            return False
+        self.counts["checks"] += 1
+        focused = self.controller.get_focused_package()
+        # None means a popup, the shade or a transition has focus: no decision, leave the screen alone
+        if focused is None or focused in self.allowed_packages:
+            self.consecutive_backs = 0
+            return False
+
+        self.counts["left_app"] += 1
+        if before_recovery is not None:
+            before_recovery()
+        if self.policy == "back" and self.consecutive_backs < self.max_backs:
+            print_with_color(f"Foreground is {focused}, not {self.package_name}. Pressing BACK to return.", "yellow")
+            self.controller.back()
+            self.consecutive_backs += 1
+            self.counts["back"] += 1
+        else:
+            print_with_color(f"Foreground is {focused}, not {self.package_name}. Relaunching the app.", "yellow")
+            self.controller.launch_app(self.package_name)
+            self.consecutive_backs = 0
+            self.counts["relaunch"] += 1
+        return True
+
+    def summary(self):
+        return (f"left the app {self.counts['left_app']} times in {self.counts['checks']} checks; "
+                f"recovered with {self.counts['back']} BACK and {self.counts['relaunch']} relaunch")
@@ -0,0 +1,87 @@
+import time
+
+from .json_store import file_lock, load_json, save_json
+from .utils import print_with_color
+
+
+class IneffectiveIndex:
+    """
+    Persistent record of elements that did nothing useful on a given screen, keyed by (screen fingerprint, uid).
+    Each entry holds a hit count that decays with a half-life, so an element that was ineffective once, long ago,
+    is offered to the VLM again instead of being hidden forever. Stored per app (apps/<app>/ineffective_index.json).
+    """
+
+    def __init__(self, path, half_life_hours=72.0, min_hits=0.5):
+        self.path = path
+        self.half_life_s = max(float(half_life_hours), 0.0) * 3600
+        self.min_hits = float(min_hits)
+        self.entries = {} # fingerprint -> {uid: {"hits": float, "updated": unix time}}
+        self._pending = [] # (op, fingerprint, uid, time) since the last save, replayed onto the file on save
+        self.load()
+
+    def load(self):
+        with file_lock(self.path):
+            data = load_json(self.path, "ineffective-element index")
+        if data is not None:
+            self.entries = data
+
+    def save(self):
+        try:
+            with file_lock(self.path):
+                data = load_json(self.path, "ineffective-element index")
+                if data is not None:
+                    # Re-read so marks saved by other processes since our load are kept, then replay ours
+                    self.entries = data
+                    for op, fingerprint, uid, when in self._pending:
+                        self._apply(op, fingerprint, uid, when)
+                # Drop entries that have decayed to nothing so the file does not grow without bound
+                now = time.time()
+                pruned = {}
+                for fingerprint, screen_entries in self.entries.items():
+                    kept = {uid: entry for uid, entry in screen_entries.items() if self._decayed_hits(entry, now) >= 0.01}
+                    if kept:
+                        pruned[fingerprint] = kept
+                self.entries = pruned
+                save_json(self.path, self.entries)
+            self._pending = []
+        except OSError as e:
+            print_with_color(f"Error saving ineffective-element index {self.path}: {e}", "red")
+
+    def _decayed_hits(self, entry, now):
+        if not self.half_life_s:
+            return entry["hits"]
+        return entry["hits"] * 0.5 ** (max(now - entry["updated"], 0) / self.half_life_s)
+
+    def hits(self, fingerprint, uid):
+        entry = self.entries.get(fingerprint, {}).get(uid)
+        return self._decayed_hits(entry, time.time()) if entry else 0.0
+
+    def is_ineffective(self, fingerprint, uid):
+        return self.hits(fingerprint, uid) >= self.min_hits
+
+    def ineffective_uids(self, fingerprint):
+        """Set of uids currently considered ineffective on the screen `fingerprint`."""
+        now = time.time()
+        return {uid for uid, entry in self.entries.get(fingerprint, {}).items()
+                if self._decayed_hits(entry, now) >= self.min_hits}
+
+    def _apply(self, op, fingerprint, uid, when):
+        if op == "mark":
+            screen_entries = self.entries.setdefault(fingerprint, {})
+            entry = screen_entries.get(uid)
+            hits = self._decayed_hits(entry, when) if entry else 0.0
+            screen_entries[uid] = {"hits": hits + 1.0, "updated": when}
+        else: # "clear"
+            screen_entries = self.entries.get(fingerprint)
+            if screen_entries is not None:
+                screen_entries.pop(uid, None)
+
+    def mark(self, fingerprint, uid):
+        """Records one more ineffective interaction with `uid` on `fingerprint`."""
+        self._pending.append(("mark", fingerprint, uid, time.time()))
+        self._apply(*self._pending[-1])
+
+    def clear(self, fingerprint, uid):
+        """Forgets `uid` on `fingerprint`, e.g. after it led to a successful step."""
+        self._pending.append(("clear", fingerprint, uid, time.time()))
+        self._apply(*self._pending[-1])
@@ -0,0 +1,75 @@
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+
+from .utils import print_with_color
+
+try:
+    import fcntl
+except ImportError: # Windows
+    fcntl = None
+    import msvcrt
+
+
+@contextmanager
+def file_lock(path):
+    """
+    Exclusive lock on `path` shared by every process and thread (e.g. fleet workers on several devices writing the
+    same apps/<app>/ store), held for the duration of the block. Uses a `path`.lock file next to the data.
+    """
+    with open(path + ".lock", "a+") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def load_json(path, description):
+    """
+    Contents of the JSON file at `path`, or None if it does not exist or cannot be read. A file that does not parse
+    is moved aside to `path`.corrupt instead of being overwritten by the next save. Call with file_lock held.
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except ValueError as e:
+        corrupt_path = path + ".corrupt"
+        print_with_color(f"Could not parse {description} {path}: {e}. Moved it to {corrupt_path} and starting a new one.", "yellow")
+        try:
+            os.replace(path, corrupt_path)
+        except OSError:
+            pass
+    except OSError as e:
+        print_with_color(f"Could not load {description} {path}: {e}. Starting a new one.", "yellow")
+    return None
+
+
+def save_json(path, data, indent=None):
+    """Writes `data` to `path` through a uniquely named temporary file, so a reader never sees a half-written file."""
+    directory = os.path.dirname(os.path.abspath(path))
+    with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=directory, prefix=os.path.basename(path) + ".",
+                                     suffix=".tmp", delete=False) as f:
+        tmp_path = f.name
+        try:
+            json.dump(data, f, indent=indent)
+        except (OSError, TypeError, ValueError):
+            f.close()
+            os.remove(tmp_path)
+            raise
+    try:
+        os.replace(tmp_path, path)
+    except OSError:
+        os.remove(tmp_path)
+        raise
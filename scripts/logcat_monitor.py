@@ -0,0 +1,119 @@
+import queue
+import re
+import subprocess
+import threading
+import time
+
+from .utils import print_with_color
+
+# `logcat -v brief` line: "E/AndroidRuntime( 1234): FATAL EXCEPTION: main"
+_BRIEF_LINE_RE = re.compile(r"^([VDIWEF])/([^(]+?)\s*\(\s*(\d+)\):\s?(.*)$")
+_CRASH_PROCESS_RE = re.compile(r"^Process: ([\w.:]+), PID: (\d+)")
+_ANR_RE = re.compile(r"^ANR in ([\w.:]+)")
+_MAX_DETAIL_LINES = 60
+
+
+class AppEvent:
+    """A crash or ANR of the monitored app. details keeps growing while the reader sees more of its lines."""
+
+    def __init__(self, kind, package, pid, first_line):
+        self.kind = kind # "crash" or "anr"
+        self.package = package
+        self.pid = pid
+        self.timestamp = time.time()
+        self.details = [first_line]
+
+    def summary(self):
+        headline = next((line for line in self.details[1:] if line.strip() and not line.startswith(("Process:", "PID:"))), "")
+        return f"{self.kind.upper()} in {self.package} (pid {self.pid}): {headline.strip()}"
+
+
+class LogcatMonitor:
+    """
+    Background `adb logcat` reader that turns FATAL EXCEPTION and ANR reports of one package into AppEvent objects
+    on a queue. Only new log lines are read (-T 1), from the crash and system buffers where both reports land.
+    """
+
+    def __init__(self, device_id, package_name):
+        self.device_id = device_id
+        self.package_name = package_name
+        self.events = queue.Queue()
+        self._proc = None
+        self._thread = None
+
+    def start(self) -> bool:
+        cmd = ["adb"]
+        if self.device_id:
+            cmd.extend(["-s", self.device_id])
+        cmd.extend(["logcat", "-v", "brief", "-b", "crash", "-b", "system", "-T", "1"])
+        try:
+            self._proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=0)
+        except (FileNotFoundError, OSError) as e:
+            print_with_color(f"Could not start logcat monitor: {e}", "red")
+            self._proc = None
+            return False
+        self._thread = threading.Thread(target=self._read, args=(self._proc.stdout,), daemon=True)
+        self._thread.start()
+        return True
+
+    def _matches(self, package):
+        # Also match the app's secondary processes, e.g. "com.app:remote"
+        return package == self.package_name or package.startswith(self.package_name + ":")
+
+    def _read(self, stream):
+        current = None # (tag, pid, AppEvent or None) of the report being collected
+        try:
+            for raw_line in iter(stream.readline, b""):
+                match = _BRIEF_LINE_RE.match(raw_line.decode("utf-8", errors="replace").rstrip("\r\n"))
+                if not match:
+                    continue
+                _, tag, pid, message = match.groups()
+
+                if tag == "AndroidRuntime" and message.startswith("FATAL EXCEPTION"):
+                    current = (tag, pid, None)
+                    continue
+                anr = _ANR_RE.match(message) if tag == "ActivityManager" else None
+                if anr:
+                    event = AppEvent("anr", anr.group(1), None, message) if self._matches(anr.group(1)) else None
+                    if event is not None:
+                        self.events.put(event)
+                    current = (tag, pid, event)
+                    continue
+                if current is None or (tag, pid) != current[:2]:
+                    current = None
+                    continue
+
+                event = current[2]
+                if event is None and tag == "AndroidRuntime":
+                    process = _CRASH_PROCESS_RE.match(message)
+                    if process and self._matches(process.group(1)):
+                        event = AppEvent("crash", process.group(1), int(process.group(2)), "FATAL EXCEPTION")
+                        event.details.append(message)
+                        self.events.put(event)
+                        current = (tag, pid, event)
+                    continue
+                if event is not None and len(event.details) < _MAX_DETAIL_LINES:
+                    if event.pid is None and message.startswith("PID:"):
+                        event.pid = int(message.split(":", 1)[1].strip() or 0)
+                    event.details.append(message)
+        except Exception:
+            pass
+
+    def poll_events(self):
+        """Returns (without blocking) every event reported since the last call."""
+        events = []
+        while True:
+            try:
+                events.append(self.events.get_nowait())
+            except queue.Empty:
+                return events
+
+    def stop(self):
+        proc, self._proc = self._proc, None
+        if proc is None:
+            return
+        try:
+            proc.terminate()
+            proc.wait(timeout=2)
+        except Exception:
+            proc.kill()
@@ -1,5 +1,7 @@
+import os
 import re
 import abc
+import tempfile
 import requests
 import dashscope
 from dashscope import MultiModalConversation
@@ -8,8 +10,10 @@ from typing import List
 import google.generativeai as genai 
 from PIL import Image 
 import traceback
+import cv2
+import numpy as np
 
-from .utils import print_with_color, encode_image # Relative imports
+from .utils import print_with_color, encode_image, to_bgr, to_rgb # Relative imports
 
 class BaseModel(abc.ABC):
     def __init__(self):
@@ -17,6 +21,7 @@ class BaseModel(abc.ABC):
 
     @abc.abstractmethod
     def get_model_response(self, prompt: str, images: List[str]) -> tuple[bool, str]:
+        # Each entry of `images` is either a file path or an in-memory image array (BGR, or raw RGBA capture)
         pass
 
 class OpenAIModel(BaseModel):
@@ -78,7 +83,15 @@ class QwenModel(BaseModel):
 
     def get_model_response(self, prompt: str, images: List[str]) -> tuple[bool, str]:
         content = [{'text': prompt}]
+        temp_files = []
         for img_path in images:
+            if isinstance(img_path, np.ndarray):
+                # DashScope only takes files/URLs, so in-memory captures are spilled to a temporary JPEG
+                fd, tmp_path = tempfile.mkstemp(suffix=".jpg")
+                os.close(fd)
+                cv2.imwrite(tmp_path, to_bgr(img_path))
+                temp_files.append(tmp_path)
+                img_path = tmp_path
             # DashScope SDK can handle local file paths for images
             content.append({"image": f"file://{img_path}"})
         
@@ -88,6 +101,16 @@ class QwenModel(BaseModel):
         }]
         
         print_with_color("Sending request to Qwen (DashScope)...", "yellow")
+        try:
+            return self._call(messages)
+        finally:
+            for tmp_path in temp_files:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+
+    def _call(self, messages):
         try:
             response = MultiModalConversation.call(model=self.model, messages=messages)
             if response.status_code == HTTPStatus.OK:
@@ -115,7 +138,7 @@ class GeminiModel(BaseModel):
             model_input = [prompt] # Start with the text prompt
             for img_path in image_paths:
                 try:
-                    img = Image.open(img_path)
+                    img = Image.fromarray(to_rgb(img_path)) if isinstance(img_path, np.ndarray) else Image.open(img_path)
                     model_input.append(img) # Append PIL Image object
                 except FileNotFoundError:
                     print_with_color(f"Image file not found: {img_path}", "red")
@@ -252,6 +275,25 @@ def parse_explore_rsp(rsp):
                 input_str = params_str[1:-1]
             return [act_name, input_str, last_act]
         
+        elif act_name == "delete_multiple":
+            num_match = re.search(r'(\d+)', params_str)
+            if not num_match:
+                print_with_color(f"Could not find count parameter for delete_multiple in '{params_str}'", "red")
+                return ["ERROR"]
+            return [act_name, int(num_match.group(1)), last_act]
+        
+        elif act_name == "scroll_to":
+            # scroll_to("target") or scroll_to("target", "up"); the target itself may contain commas
+            target, direction = params_str, "up"
+            head, sep, tail = params_str.rpartition(",")
+            if sep and tail.strip(" '\"").lower() in ("up", "down", "left", "right"):
+                target, direction = head, tail.strip(" '\"").lower()
+            target = target.strip().strip("'\"")
+            if not target:
+                print_with_color(f"Missing target for scroll_to in '{params_str}'", "red")
+                return ["ERROR"]
+            return [act_name, target, direction, last_act]
+        
         elif act_name == "swipe_element": 
             try:
                 parts = [p.strip(" '\"") for p in params_str.split(",")]
@@ -90,12 +90,12 @@ General Hints for Common Scenarios:
 - Deleting Text: Use `press_delete()` to delete the last character or currently selected text. **To clear a field with multiple characters (e.g., 'Hello'), you would typically need to call `press_delete()` five times if no text is selected.**
 - Deleting Text:
     - `press_delete()`: Deletes the character before the cursor or selected text.
-    - **To clear a field with multiple characters (e.g., 'XYZ'), you would need to call `press_delete()` three times.** Consider this if you need to replace existing text completely.
+    - **To clear a field with multiple characters (e.g., 'XYZ'), use `delete_multiple(3)` instead of calling `press_delete()` three times.** Consider this if you need to replace existing text completely.
 - Submitting Forms: After typing in a text field, use `press_enter()` to submit the form.
 - Closing Notifications: Use `close_notifications()`. If it fails, you can try `swipe_screen("up", "medium")` to close the notification shade.
 - General Navigation: Use `press_back()` to go to the previous screen. Use `press_home()` to go to the home screen.
 - Task Completion: If the task asks you to return to a specific screen (like the home screen) as a final step, and you have reached that screen after performing all other required actions, you should consider the task complete and use the FINISH action.
-- If you encounter a text field, you can try `type_global("test input")` or a more relevant generic term. **If you want to clear existing text in a field, remember that `press_delete()` deletes one character at a time (or a selection). So, to clear 'ABC', you'd use `press_delete()` three times.**
+- If you encounter a text field, you can try `type_global("test input")` or a more relevant generic term. **If you want to clear existing text in a field, remember that `press_delete()` deletes one character at a time (or a selection). So, to clear 'ABC', use `delete_multiple(3)` rather than three separate `press_delete()` actions.**
 - **Verifying Task Completion:** After performing actions that should complete a key part of the task (e.g., saving something, sending a message, creating an item), carefully observe the screen. Look for confirmation messages, the presence of the newly created item, or a return to an expected state that indicates success. If you see clear evidence the task is done, use FINISH.
 - Task Completion: If the task asks you to return to a specific screen (like the home screen) as a final step, and you have reached that screen after performing all other required actions, you should consider the task complete and use the FINISH action. **More generally, if all explicit goals in <task_description> (e.g., "create X," "send Y," "find Z") have been visibly achieved on screen or through your actions, use FINISH.**
 
@@ -114,6 +114,7 @@ Available Functions:
     `direction` must be one of ["up", "down", "left", "right"].
     `distance` must be one of ["short", "medium", "long"] (e.g., short ~25% of screen, medium ~50%, long ~75%).
     Example: swipe_screen("down", "long")
+    To look for a specific item in a long list, prefer scroll_to over repeated swipe_screen calls.
 6.  press_back(): Press the Android system Back button.
 7.  press_home(): Press the Android system Home button.
 8.  press_enter(): Press the Enter/Go key (usually on a virtual keyboard).
@@ -122,7 +123,9 @@ Available Functions:
 11. open_notifications(): Attempt to open the notification shade.
 12. press_app_switch(): Show the recent apps overview.
 13. grid(): If the target UI element is not labeled or labels are unhelpful, call this to switch to a grid-based interaction mode for the next step.
-14. FINISH: Call this if you believe the task <task_description> is fully completed.
+14. scroll_to(target: str, direction: str): Keep swiping the screen in `direction` (as in swipe_screen; default "up", which reveals content further down) until an element whose text, content description or resource id matches `target` is visible, or the end of the list is reached. All swipes happen in this single step.
+    Example: scroll_to("Battery") or scroll_to("Privacy", "up")
+15. FINISH: Call this if you believe the task <task_description> is fully completed.
 
 Output Format (Strictly follow this):
 Observation: <Your detailed observation of the current screen, noting relevant UI elements, their labels, and any provided documentation. How does the screen relate to the task?>
@@ -242,7 +245,7 @@ General Hints for Casual Exploration:
     3. Use `type_global("your new text")` to input the desired text.
 - Deleting Text:
     - `press_delete()`: Deletes the character before the cursor or selected text.
-    - **To clear a field with multiple characters (e.g., 'XYZ'), you would need to call `press_delete()` three times.** Consider this if you need to replace existing text completely.
+    - **To clear a field with multiple characters (e.g., 'XYZ'), use `delete_multiple(3)` instead of calling `press_delete()` three times.** Consider this if you need to replace existing text completely.
 - **Verifying Task Completion:** (This section is more relevant to task_template but kept for consistency in available functions) After performing actions that should complete a key part of the task (e.g., saving something, sending a message, creating an item), carefully observe the screen. Look for confirmation messages, the presence of the newly created item, or a return to an expected state that indicates success. If you see clear evidence the task is done, use FINISH.
     
 Available Functions: (Remember to use the simple format, e.g., `tap(5)`)
@@ -260,6 +263,7 @@ Available Functions: (Remember to use the simple format, e.g., `tap(5)`)
 12. grid()
 13. FINISH: *Do NOT use FINISH in explore mode.* The agent will run for a set number of rounds or until manually stopped.
 14. delete_multiple(count: int): Press the Delete/Backspace key 'count' times. Example: delete_multiple(5)
+15. scroll_to(target: str, direction: str): Swipe in `direction` (default "up") until an element matching `target` (text, content description or resource id) is visible, all in one step. Example: scroll_to("Battery")
 
 Output Format (Strictly follow this):
 Observation: <Your observation of the screen, focusing on what's new or interactive *within the current app*.>
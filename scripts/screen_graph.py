@@ -0,0 +1,143 @@
+import hashlib
+import io
+import time
+import xml.etree.ElementTree as ET
+from collections import deque
+
+from .json_store import file_lock, load_json, save_json
+from .ui_diff import IGNORED_PACKAGES
+from .utils import print_with_color
+
+
+def screen_fingerprint(xml_source):
+    """
+    Fingerprint of a screen from its hierarchy dump (file path or XML bytes), or None if it cannot be parsed.
+    Only structure is hashed: the set of (depth, class, resource-id) lines. Text, content descriptions, bounds and
+    how many times a list row repeats are ignored, so the same screen with different data maps to the same value.
+    """
+    source = io.BytesIO(xml_source) if isinstance(xml_source, (bytes, bytearray)) else xml_source
+    lines = set()
+    depth = 0
+    try:
+        for event, elem in ET.iterparse(source, ("start", "end")):
+            if event == "end":
+                depth -= 1
+                continue
+            depth += 1
+            if elem.tag == "node" and elem.get("package") not in IGNORED_PACKAGES:
+                lines.add(f"{depth}|{elem.get('class', '')}|{elem.get('resource-id', '')}")
+    except (ET.ParseError, OSError) as e:
+        print_with_color(f"Error parsing hierarchy for fingerprint: {e}", "red")
+        return None
+    return hashlib.sha1("\n".join(sorted(lines)).encode("utf-8")).hexdigest()[:16]
+
+
+def action_key(act_name, uid="", *params):
+    """Stable name of an action for graph edges, e.g. "tap:com.app_id_search" or "swipe_screen:up:medium"."""
+    return ":".join(str(part) for part in (act_name, uid, *params) if part not in ("", None))
+
+
+class ScreenGraph:
+    """
+    Directed screen -> action -> screen graph for one app, persisted as JSON (apps/<app>/screen_graph.json).
+    screens:     {fingerprint: {"visits": n, "first_seen": ts, "last_seen": ts}}
+    transitions: {from_fingerprint: {action_key: {to_fingerprint: count}}}
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.screens = {}
+        self.transitions = {}
+        # Counts recorded since the last save, merged into the file on save (other processes may share it)
+        self._new_screens = {}
+        self._new_transitions = {}
+        self.load()
+
+    def load(self):
+        with file_lock(self.path):
+            data = load_json(self.path, "screen graph")
+        if data is not None:
+            self.screens = data.get("screens", {})
+            self.transitions = data.get("transitions", {})
+
+    def save(self):
+        try:
+            with file_lock(self.path):
+                data = load_json(self.path, "screen graph")
+                if data is not None:
+                    # Re-read so counts saved by other processes since our load are kept, then add ours
+                    self.screens = data.get("screens", {})
+                    self.transitions = data.get("transitions", {})
+                    self._merge(self.screens, self.transitions, self._new_screens, self._new_transitions)
+                save_json(self.path, {"screens": self.screens, "transitions": self.transitions})
+            self._new_screens, self._new_transitions = {}, {}
+        except OSError as e:
+            print_with_color(f"Error saving screen graph {self.path}: {e}", "red")
+
+    @staticmethod
+    def _merge(screens, transitions, new_screens, new_transitions):
+        """Adds the visit and transition counts of new_screens / new_transitions to screens / transitions."""
+        for fingerprint, new in new_screens.items():
+            screen = screens.setdefault(fingerprint, {"visits": 0, "first_seen": new["first_seen"], "last_seen": new["last_seen"]})
+            screen["visits"] += new["visits"]
+            screen["first_seen"] = min(screen["first_seen"], new["first_seen"])
+            screen["last_seen"] = max(screen["last_seen"], new["last_seen"])
+        for from_fp, actions in new_transitions.items():
+            for action, new_targets in actions.items():
+                targets = transitions.setdefault(from_fp, {}).setdefault(action, {})
+                for to_fp, count in new_targets.items():
+                    targets[to_fp] = targets.get(to_fp, 0) + count
+
+    def record_visit(self, fingerprint):
+        """Counts a visit to `fingerprint`. Returns the number of visits before this one (0 for a new screen)."""
+        now = int(time.time())
+        previous_visits = self.visits(fingerprint)
+        visit = {fingerprint: {"visits": 1, "first_seen": now, "last_seen": now}}
+        self._merge(self.screens, {}, visit, {})
+        self._merge(self._new_screens, {}, visit, {})
+        return previous_visits
+
+    def record_transition(self, from_fp, action, to_fp):
+        transition = {from_fp: {action: {to_fp: 1}}}
+        self._merge({}, self.transitions, {}, transition)
+        self._merge({}, self._new_transitions, {}, transition)
+
+    # --- Queries ---
+    def visits(self, fingerprint):
+        return self.screens.get(fingerprint, {}).get("visits", 0)
+
+    def transitions_from(self, fingerprint):
+        """[(action_key, to_fingerprint, count), ...] known from `fingerprint`, most frequent first."""
+        edges = [(action, to_fp, count)
+                 for action, targets in self.transitions.get(fingerprint, {}).items()
+                 for to_fp, count in targets.items()]
+        return sorted(edges, key=lambda edge: -edge[2])
+
+    def expected_target(self, fingerprint, action):
+        """Screen most often reached by `action` from `fingerprint`, or None if never observed."""
+        targets = self.transitions.get(fingerprint, {}).get(action)
+        if not targets:
+            return None
+        return max(targets, key=targets.get)
+
+    def find_path(self, from_fp, to_fp):
+        """Shortest list of action keys leading from `from_fp` to `to_fp` (breadth-first), or None if unknown."""
+        if from_fp == to_fp:
+            return []
+        previous = {from_fp: None}
+        queue = deque([from_fp])
+        while queue:
+            current = queue.popleft()
+            for action, targets in self.transitions.get(current, {}).items():
+                for target in targets:
+                    if target in previous or target == current:
+                        continue
+                    previous[target] = (current, action)
+                    if target == to_fp:
+                        path = []
+                        while previous[target] is not None:
+                            target, action_taken = previous[target]
+                            path.append(action_taken)
+                        return path[::-1]
+                    queue.append(target)
+        return None
@@ -0,0 +1,137 @@
+import re
+import time
+
+from .json_store import file_lock, load_json, save_json
+from .utils import print_with_color
+
+# Actions whose first parameter is an element label; cached steps store the element uid instead
+ELEMENT_ACTIONS = ("tap", "long_press", "swipe_element")
+
+
+def normalize_task(description):
+    """Lowercases and collapses whitespace/trailing punctuation so trivially different phrasings share a cache entry."""
+    return re.sub(r"\s+", " ", str(description).strip().lower()).strip(" .!?")
+
+
+def step_from_action(fingerprint, action_res, uid, elem_table=None):
+    """
+    Converts a parsed action (as returned by parse_explore_rsp) taken on screen `fingerprint` into a cache step.
+    Element labels are replaced by the element uid, since labels are only meaningful for one capture. Rows of a list
+    share a uid, so element steps also record which of the same-uid elements was used and its bounds (`elem_table`
+    is the table the label refers to).
+    """
+    act_name = action_res[0]
+    step = {"fingerprint": fingerprint, "action": act_name, "uid": uid}
+    if act_name == "FINISH":
+        params = []
+    elif act_name in ELEMENT_ACTIONS:
+        params = action_res[2:-1]
+        if elem_table is not None and elem_table.has_label(action_res[1]):
+            step["occurrence"] = elem_table.occurrence(action_res[1])
+            step["bounds"] = [int(v) for v in elem_table.bounds[action_res[1] - 1]]
+    else:
+        params = action_res[1:-1]
+    step["params"] = list(params)
+    return step
+
+
+class TrajectoryCache:
+    """
+    Successful task trajectories keyed by (package, normalized task description), persisted as JSON
+    (apps/<app>/trajectory_cache.json). Each entry is the list of steps from the first screen to FINISH.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self.load()
+
+    @staticmethod
+    def _key(package, task):
+        return f"{package}|{normalize_task(task)}"
+
+    def load(self):
+        with file_lock(self.path):
+            data = load_json(self.path, "trajectory cache")
+        if data is not None:
+            self.entries = data
+
+    def get(self, package, task):
+        entry = self.entries.get(self._key(package, task))
+        return entry["steps"] if entry else None
+
+    def store(self, package, task, steps):
+        """Records `steps` (ending with FINISH) as the trajectory for this task and saves the cache."""
+        if not steps or steps[-1]["action"] != "FINISH":
+            return
+        key = self._key(package, task)
+        try:
+            with file_lock(self.path):
+                # Re-read first: other processes (e.g. fleet workers on other devices) may have stored entries
+                data = load_json(self.path, "trajectory cache")
+                if data is not None:
+                    self.entries = data
+                previous = self.entries.get(key)
+                successes = previous["successes"] + 1 if previous and previous["steps"] == steps else 1
+                self.entries[key] = {"steps": steps, "successes": successes, "updated": int(time.time())}
+                save_json(self.path, self.entries, indent=1)
+        except OSError as e:
+            print_with_color(f"Error saving trajectory cache {self.path}: {e}", "red")
+
+
+class TrajectoryReplay:
+    """
+    Walks a cached trajectory, yielding actions while the live screens match the recorded fingerprints.
+    The final FINISH is never replayed: the VLM checks the end screen, so a replayed run only counts as a success
+    once the end state has been confirmed.
+    """
+
+    def __init__(self, steps):
+        self.steps = steps
+        self.position = 0
+
+    def at_finish(self):
+        """True once every step before the cached FINISH has been replayed."""
+        return self.position < len(self.steps) and self.steps[self.position]["action"] == "FINISH"
+
+    def expected_fingerprint(self):
+        """Fingerprint the screen should have after the last replayed step, or None once the trajectory is exhausted."""
+        return self.steps[self.position]["fingerprint"] if self.position < len(self.steps) else None
+
+    @staticmethod
+    def _resolve_label(step, elem_table):
+        """Label of the step's element in `elem_table`, or None if it is missing or cannot be told apart."""
+        labels = elem_table.labels_of(step["uid"])
+        occurrence = step.get("occurrence")
+        if occurrence is None: # Step cached without an occurrence: only usable when the uid is unique
+            return labels[0] if len(labels) == 1 else None
+        if occurrence >= len(labels):
+            return None
+        label = labels[occurrence]
+        if step.get("bounds") is not None and [int(v) for v in elem_table.bounds[label - 1]] != step["bounds"]:
+            return None # The list has a different layout than when it was recorded
+        return label
+
+    def next_action(self, fingerprint, elem_table):
+        """
+        Returns the cached action for the current screen in parse_explore_rsp form, with element uids resolved to
+        labels in `elem_table`. Returns None at the first divergence (different screen, missing or ambiguous element),
+        at the cached FINISH (see at_finish) or once the trajectory is exhausted; the caller then hands control back
+        to the VLM.
+        """
+        if self.position >= len(self.steps) or self.at_finish():
+            return None
+        step = self.steps[self.position]
+        if not fingerprint or step["fingerprint"] != fingerprint:
+            return None
+        act_name = step["action"]
+        summary = f"Replayed cached step {self.position + 1}/{len(self.steps)}: {act_name}"
+        if act_name in ELEMENT_ACTIONS:
+            label = self._resolve_label(step, elem_table)
+            if label is None:
+                return None
+            action_res = [act_name, label, *step["params"], summary]
+        else:
+            action_res = [act_name, *step["params"], summary]
+        self.position += 1
+        return action_res
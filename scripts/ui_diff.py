@@ -0,0 +1,102 @@
+import io
+import xml.etree.ElementTree as ET
+
+from .utils import print_with_color
+
+# Packages whose nodes change on their own (status bar clock, battery, notification icons) and are not caused by
+# the agent's action.
+IGNORED_PACKAGES = ("com.android.systemui",)
+
+
+class UiNode:
+    __slots__ = ("bounds", "text", "content_desc", "focused", "checked", "selected")
+
+    def __init__(self, elem):
+        self.bounds = elem.get("bounds", "")
+        self.text = elem.get("text", "")
+        self.content_desc = elem.get("content-desc", "")
+        self.focused = elem.get("focused") == "true"
+        self.checked = elem.get("checked") == "true"
+        self.selected = elem.get("selected") == "true"
+
+
+def snapshot_hierarchy(xml_source):
+    """
+    Parses a hierarchy dump (file path or XML bytes) into {structural_key: UiNode}, or None if it cannot be parsed.
+    The key is the node's path of class, resource-id and sibling index from the root, so it survives text and bounds
+    changes. Nodes from IGNORED_PACKAGES are skipped.
+    """
+    source = io.BytesIO(xml_source) if isinstance(xml_source, (bytes, bytearray)) else xml_source
+    nodes = {}
+    path = []
+    try:
+        for event, elem in ET.iterparse(source, ("start", "end")):
+            if event == "end":
+                if path:
+                    path.pop()
+                continue
+            if elem.tag != "node":
+                path.append(elem.tag)
+                continue
+            path.append(f"{elem.get('class', '')}#{elem.get('resource-id', '')}[{elem.get('index', '0')}]")
+            if elem.get("package") in IGNORED_PACKAGES:
+                continue
+            key = "/".join(path)
+            while key in nodes: # Repeated sibling index (rare in uiautomator output); keep both nodes
+                key += "+"
+            nodes[key] = UiNode(elem)
+    except (ET.ParseError, OSError) as e:
+        print_with_color(f"Error parsing hierarchy for diff: {e}", "red")
+        return None
+    return nodes
+
+
+class UiDiff:
+    """
+    Structural difference between two hierarchy snapshots. Each list holds structural keys.
+    score is the fraction of nodes affected by any change (0.0 means identical, 1.0 an entirely different screen).
+    """
+
+    def __init__(self, added, removed, moved, text_changed, focus_changed, total_nodes):
+        self.added = added
+        self.removed = removed
+        self.moved = moved
+        self.text_changed = text_changed
+        self.focus_changed = focus_changed # focused/checked/selected toggled
+        self.total_nodes = total_nodes
+        changed = len(added) + len(removed) + len(set(moved) | set(text_changed) | set(focus_changed))
+        self.score = min(1.0, changed / total_nodes) if total_nodes else 0.0
+
+    def is_unchanged(self, threshold=0.0):
+        return self.score <= threshold
+
+    def summary(self):
+        return (f"added={len(self.added)} removed={len(self.removed)} moved={len(self.moved)} "
+                f"text={len(self.text_changed)} focus={len(self.focus_changed)} score={self.score:.3f}")
+
+
+def diff_snapshots(before, after):
+    before_keys, after_keys = before.keys(), after.keys()
+    added = [key for key in after if key not in before]
+    removed = [key for key in before if key not in after]
+    moved, text_changed, focus_changed = [], [], []
+    for key in before_keys & after_keys:
+        old, new = before[key], after[key]
+        if old.bounds != new.bounds:
+            moved.append(key)
+        if old.text != new.text or old.content_desc != new.content_desc:
+            text_changed.append(key)
+        if old.focused != new.focused or old.checked != new.checked or old.selected != new.selected:
+            focus_changed.append(key)
+    return UiDiff(added, removed, moved, text_changed, focus_changed, len(before_keys | after_keys))
+
+
+def diff_hierarchies(before_xml, after_xml):
+    """Diffs two hierarchy dumps (paths or XML bytes). Returns a UiDiff, or None if either cannot be parsed."""
+    before = snapshot_hierarchy(before_xml)
+    if before is None:
+        return None
+    after = snapshot_hierarchy(after_xml)
+    if after is None:
+        return None
+    return diff_snapshots(before, after)
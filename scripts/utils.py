@@ -85,8 +85,39 @@ def putBText(img,text,text_offset_x=20,text_offset_y=20,vspace=10,hspace=10, fon
     cv2.putText(img, text, (text_draw_x, text_draw_y), font, fontScale=font_scale, color=(text_B, text_G, text_R), thickness=thickness)
     return img
 
+def to_bgr(img):
+    """
+    Normalizes an in-memory capture to a writable 3-channel BGR array.
+    4-channel arrays are raw framebuffer views (RGBA, see parse_raw_screencap) and are converted in one pass;
+    3-channel arrays are already BGR and are copied so callers can draw on the result.
+    """
+    if img.ndim == 3 and img.shape[2] == 4:
+        return cv2.cvtColor(img, cv2.COLOR_RGBA2BGR)
+    return img.copy()
+
+def to_rgb(img):
+    """Returns an RGB array for PIL/VLM SDKs from any in-memory capture (BGR or raw RGBA)."""
+    if img.ndim == 3 and img.shape[2] == 4:
+        return cv2.cvtColor(img, cv2.COLOR_RGBA2RGB)
+    return cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+
+def screens_match(img_a, img_b, max_mean_diff=2.0):
+    """
+    True when two in-memory captures show the same screen: their 64x64 grayscale thumbnails differ by at most
+    `max_mean_diff` gray levels on average. Catches WebView, canvas and image changes the UI hierarchy misses.
+    """
+    if img_a is None or img_b is None or img_a.shape[:2] != img_b.shape[:2]:
+        return False
+    thumbs = [cv2.resize(cv2.cvtColor(to_bgr(img), cv2.COLOR_BGR2GRAY), (64, 64), interpolation=cv2.INTER_AREA)
+              for img in (img_a, img_b)]
+    return float(cv2.absdiff(thumbs[0], thumbs[1]).mean()) <= max_mean_diff
+
 def draw_bbox_multi(img_path, output_path, elem_list, dark_mode=False): # dark_mode param kept for now, but not used for fixed colors
-    img = cv2.imread(img_path)
+    # img_path may also be an in-memory image array (e.g. from AndroidController.get_screenshot_image)
+    if isinstance(img_path, np.ndarray):
+        img = to_bgr(img_path) # Labels are drawn in place; keep the caller's capture untouched
+    else:
+        img = cv2.imread(img_path)
     if img is None:
         print_with_color(f"Error: Could not read image at {img_path}", "red")
         return None
@@ -98,15 +129,18 @@ def draw_bbox_multi(img_path, output_path, elem_list, dark_mode=False): # dark_m
     text_background_color_rgb = [200, 200, 200]  # Light gray background
     text_thickness = 3  # Bolder text
 
-    for elem in elem_list:
+    # elem_list may be an ElementTable (precomputed centers) or a list of AndroidElement
+    centers = getattr(elem_list, "centers", None)
+    if centers is None:
+        centers = [((elem.bbox[0][0] + elem.bbox[1][0]) // 2, (elem.bbox[0][1] + elem.bbox[1][1]) // 2) for elem in elem_list]
+    else:
+        centers = centers.tolist()
+
+    for center_x, center_y in centers:
         count += 1
-        tl, br = elem.bbox[0], elem.bbox[1]
         label_text = str(count)
 
         try:
-            # Calculate center of the element's bounding box
-            center_x = (tl[0] + br[0]) // 2
-            center_y = (tl[1] + br[1]) // 2
 
             # Estimate text size to help center the background box around the text
             # This is a bit heuristic with putBText as it manages its own padding (vspace, hspace)
@@ -151,9 +185,17 @@ def draw_bbox_multi(img_path, output_path, elem_list, dark_mode=False): # dark_m
             except Exception as e_fallback:
                  print_with_color(f"Fallback cv2.putText also failed for element {count}: {e_fallback}", "red")
 
-    cv2.imwrite(output_path, img)
+    if output_path:
+        cv2.imwrite(output_path, img)
     return img
 
 def encode_image(image_path):
+    # In-memory captures are JPEG-encoded directly instead of round-tripping through a file
+    if isinstance(image_path, np.ndarray):
+        bgr = to_bgr(image_path) if image_path.shape[-1] == 4 else image_path
+        ok, buf = cv2.imencode(".jpg", bgr)
+        if not ok:
+            raise ValueError("Could not JPEG-encode in-memory image")
+        return base64.b64encode(buf.tobytes()).decode('utf-8')
     with open(image_path, "rb") as image_file:
         return base64.b64encode(image_file.read()).decode('utf-8')
\ No newline at end of file
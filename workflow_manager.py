@@ -1,33 +1,81 @@
 import argparse
+import json
 import os
+import queue
+import signal
+import subprocess
 import sys
+import threading
 import time
 
 try:
+    from adb_controller import run_adb_command
     from apk_info import get_apk_info
     from install_apk import install_apk
     from check_package import is_package_installed, get_package_version
     from scripts.utils import print_with_color
+    from scripts.fleet_worker import FLEET_RESULT_PREFIX
 except ImportError as e:
     print(f"Error importing helper modules or scripts.utils: {e}")
     print("Please ensure apk_info.py, install_apk.py, check_package.py, and the 'scripts' package (with utils.py) are accessible.")
     sys.exit(1)
 
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def agent_app_name(app_name_from_apk):
+    """Folder-safe app name passed to the agent as --app_name."""
+    name = "".join(filter(str.isalnum, app_name_from_apk)) if app_name_from_apk else "UnknownApp"
+    return name or "DefaultApp"
+
+def install_and_verify(apk_file_path, package_name, app_name_from_apk, serial=None, max_install_retries=2, install_wait_time=5):
+    """Installs the APK on `serial` (or the only attached device) and checks the package is present. Returns True on success."""
+    for attempt in range(max_install_retries):
+        print_with_color(f"  Installation attempt {attempt + 1}/{max_install_retries}...", "cyan")
+        if install_apk(apk_file_path, serial): 
+            print_with_color(f"  Waiting {install_wait_time} seconds for installation to settle...", "cyan")
+            time.sleep(install_wait_time)
+            if is_package_installed(package_name, serial):
+                installed_version = get_package_version(package_name, serial)
+                version_str = f" (Version: {installed_version})" if installed_version else ""
+                print_with_color(f"[SUCCESS] '{app_name_from_apk}'{version_str} is installed and verified.", "green")
+                return True
+            else:
+                print_with_color(f"  [WARNING] Installation reported success by 'install_apk', but package '{package_name}' not found after waiting.", "orange")
+        else:
+            print_with_color(f"  [INFO] Installation attempt {attempt + 1} failed (as reported by 'install_apk').", "orange")
+
+        if attempt < max_install_retries - 1:
+            print_with_color(f"  Retrying in {install_wait_time // 2} seconds...", "cyan")
+            time.sleep(install_wait_time // 2)
+    print_with_color(f"[ERROR] Failed to install and verify '{app_name_from_apk}' after {max_install_retries} attempts.", "red")
+    return False
+
 def main_workflow(apk_file_path, 
                   task_description, 
                   root_dir_for_agent=".", 
                   agent_model_choice=None, # New parameter
                   agent_api_key=None,      # New parameter
                   max_install_retries=2, 
-                  install_wait_time=5):
+                  install_wait_time=5,
+                  device_serial=None):
     """
     Manages the workflow:
     1. Gets APK info (package name, app name).
     2. Installs the APK on the device.
     3. Verifies installation.
-    4. Passes info (including optional model/key) to the agent and runs it.
+    4. Runs the agent in-process through an AgentSession (optional model/key overrides applied).
+    task_description may be a list of tasks; they run back-to-back on the same session (one controller and VLM
+    client). Returns the list of TaskResult objects, or None if the agent could not be started.
     """
     print_with_color("--- Starting APK Processing, Installation, and Agent Workflow ---", "blue")
+    tasks = [task_description] if isinstance(task_description, str) else list(task_description)
+
+    if not device_serial:
+        devices = attached_devices()
+        if len(devices) != 1:
+            print_with_color(f"[ERROR] Expected exactly one online device, found {len(devices)}. Pass a device serial (--device).", "red")
+            return
+        device_serial = devices[0]
 
     # --- Step 1: Get APK Info ---
     if not os.path.exists(apk_file_path):
@@ -51,96 +99,356 @@ def main_workflow(apk_file_path,
 
     # --- Step 2: Install APK and Verify ---
     print_with_color(f"\n[INFO] Attempting to install '{app_name_from_apk}' ({package_name})...", "yellow")
-    installed_successfully = False
-    for attempt in range(max_install_retries):
-        print_with_color(f"  Installation attempt {attempt + 1}/{max_install_retries}...", "cyan")
-        if install_apk(apk_file_path): 
-            print_with_color(f"  Waiting {install_wait_time} seconds for installation to settle...", "cyan")
-            time.sleep(install_wait_time)
-            if is_package_installed(package_name):
-                installed_version = get_package_version(package_name)
-                version_str = f" (Version: {installed_version})" if installed_version else ""
-                print_with_color(f"[SUCCESS] '{app_name_from_apk}'{version_str} is installed and verified.", "green")
-                installed_successfully = True
-                break
-            else:
-                print_with_color(f"  [WARNING] Installation reported success by 'install_apk', but package '{package_name}' not found after waiting.", "orange")
-        else:
-            print_with_color(f"  [INFO] Installation attempt {attempt + 1} failed (as reported by 'install_apk').", "orange")
-
-        if attempt < max_install_retries - 1:
-            print_with_color(f"  Retrying in {install_wait_time // 2} seconds...", "cyan")
-            time.sleep(install_wait_time // 2)
-        else:
-            print_with_color(f"[ERROR] Failed to install and verify '{app_name_from_apk}' after {max_install_retries} attempts.", "red")
-            return
-
-    if not installed_successfully:
-        print_with_color(f"[ERROR] Unknown error: Installation loop completed without success for '{app_name_from_apk}'.", "red")
+    if not install_and_verify(apk_file_path, package_name, app_name_from_apk, device_serial, max_install_retries, install_wait_time):
         return
 
     # --- Step 3: Run the Agent ---
     print_with_color("\n--- Workflow Step 3: Launching Agent ---", "blue")
     
-    agent_app_name_arg = "".join(filter(str.isalnum, app_name_from_apk)) if app_name_from_apk else "UnknownApp"
-    if not agent_app_name_arg: agent_app_name_arg = "DefaultApp"
+    agent_app_name_arg = agent_app_name(app_name_from_apk)
 
     print_with_color(f"  Agent will use App Name for folders: {agent_app_name_arg}", "cyan")
     print_with_color(f"  Agent will target Package Name: {package_name}", "cyan")
-    print_with_color(f"  Agent will use Task Description: {task_description}", "cyan")
+    print_with_color(f"  Agent will use Task Description(s): {'; '.join(tasks)}", "cyan")
     print_with_color(f"  Agent will use Root Directory: {os.path.abspath(root_dir_for_agent)}", "cyan")
+    print_with_color(f"  Agent will use Device: {device_serial}", "cyan")
     if agent_model_choice:
         print_with_color(f"  Agent will use Model Choice (override): {agent_model_choice}", "cyan")
     if agent_api_key:
         print_with_color(f"  Agent will use API Key (override): {'*' * (len(agent_api_key) - 4) + agent_api_key[-4:] if len(agent_api_key) > 4 else '********'}", "cyan") # Mask key
 
     try:
-        from scripts.self_explorer import main as agent_main
-
-        original_argv = sys.argv
-        simulated_argv = [
-            "scripts/self_explorer.py", 
-            "--app_name", agent_app_name_arg,
-            "--package_name", package_name,
-            "--description", task_description,
-            "--root_dir", os.path.abspath(root_dir_for_agent)
-        ]
-        
-        # Add model choice and API key if provided to workflow_manager
-        if agent_model_choice:
-            simulated_argv.extend(["--model_choice", agent_model_choice])
-        if agent_api_key:
-            # Note: --api_key for self_explorer requires --model_choice to also be set (or determined from config/env)
-            # The self_explorer.py script handles this validation.
-            simulated_argv.extend(["--api_key", agent_api_key])
-
-        sys.argv = simulated_argv
-        
-        print_with_color(f"\n[INFO] Executing agent with args: {simulated_argv}", "yellow")
-        agent_main()
-
-    except ImportError:
-        print_with_color("[ERROR] Could not import agent's main function (scripts.self_explorer.main). Agent step skipped.", "red")
-    except SystemExit as e:
-        if e.code == 0:
-            print_with_color("[INFO] Agent exited normally.", "green")
-        else:
-            print_with_color(f"[WARNING] Agent exited with code {e.code}.", "orange")
+        from scripts.agent_session import AgentSession, apply_model_overrides, build_model
+        from scripts.and_controller import AndroidController
+        from scripts.config import load_config
+    except ImportError as e:
+        print_with_color(f"[ERROR] Could not import the agent (scripts.agent_session): {e}. Agent step skipped.", "red")
+        return
+
+    configs = load_config()
+    if not apply_model_overrides(configs, agent_model_choice, agent_api_key):
+        return
+    model = build_model(configs)
+    if model is None:
+        return
+
+    results = []
+    session = AgentSession(configs, AndroidController(device_serial), model, os.path.abspath(root_dir_for_agent))
+    try:
+        for task in tasks:
+            print_with_color(f"\n[INFO] Running agent task: {task}", "yellow")
+            result = session.run_task(agent_app_name_arg, package_name, task)
+            results.append(result)
+            print_with_color(f"[INFO] Task finished with status '{result.status}' after {result.rounds} round(s).",
+                             "green" if result.status == "completed" else "orange")
+            if result.status == "interrupted":
+                break
     except Exception as e:
         print_with_color(f"[ERROR] Error during agent execution: {e}", "red")
         import traceback
         traceback.print_exc()
     finally:
-        if 'original_argv' in locals():
-            sys.argv = original_argv
+        session.close()
 
     print_with_color("\n--- Workflow Completed ---", "blue")
+    return results
+
+
+# --- Fleet mode: many (apk, task, model) jobs spread over several devices ---
+
+def attached_devices():
+    """Serials of the devices adb reports in the 'device' (online) state."""
+    output = run_adb_command("devices") or ""
+    return [line.split("\t")[0] for line in output.splitlines()[1:] if line.strip().endswith("\tdevice")]
+
+def load_fleet_jobs(jobs_path):
+    """
+    Reads fleet jobs from a JSONL file, one object per line: {"apk": path, "task": description} plus optional
+    "model" (OpenAI, Qwen, Gemini), "api_key" and "id". Blank lines and lines starting with # are skipped.
+    """
+    jobs = []
+    with open(jobs_path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                job = json.loads(line)
+            except ValueError as e:
+                print_with_color(f"[WARNING] Skipping line {line_no} of {jobs_path}: invalid JSON ({e}).", "orange")
+                continue
+            if not isinstance(job, dict) or not job.get("apk") or not job.get("task"):
+                print_with_color(f"[WARNING] Skipping line {line_no} of {jobs_path}: 'apk' and 'task' are required.", "orange")
+                continue
+            job.setdefault("id", f"job{line_no}")
+            jobs.append(job)
+    return jobs
+
+class ResultsSink:
+    """Appends one JSON line per finished job; each line is flushed at once so an interrupted fleet keeps its results."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def write(self, result):
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(result) + "\n")
+
+class AgentWorkerProcess:
+    """
+    One long-lived agent process per fleet device (scripts.fleet_worker). It reuses a single AgentSession, and so one
+    controller, shell session and device profile, for all of that device's jobs. A crash or timeout only loses that
+    process, and the next job starts a fresh one; device settings a killed process left changed are restored here.
+    """
+
+    def __init__(self, serial, root_dir_for_agent, log_dir, grace_period=30):
+        self.serial = serial
+        self.root_dir = os.path.abspath(root_dir_for_agent)
+        self.log_path = os.path.join(log_dir, f"worker_{serial.replace(':', '_')}.log")
+        # Written by the process with the device settings it changed, removed once it has restored them itself
+        self.profile_path = os.path.join(log_dir, f"worker_{serial.replace(':', '_')}.profile.json")
+        self.grace_period = grace_period
+        self.proc = None
+        self._replies = None
+        self._log_file = None
+
+    def _start(self):
+        self._log_file = open(self.log_path, "a", encoding="utf-8")
+        # Own process group on POSIX, so a process that must be killed takes its adb children (logcat, shell) with it
+        self.proc = subprocess.Popen([sys.executable, "-m", "scripts.fleet_worker", "--device", self.serial, "--root_dir", self.root_dir,
+                                      "--profile_file", self.profile_path],
+                                     cwd=REPO_DIR, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=self._log_file,
+                                     text=True, encoding="utf-8", bufsize=1, start_new_session=os.name != "nt")
+        self._replies = queue.Queue()
+        threading.Thread(target=self._pump, args=(self.proc.stdout, self._replies, self._log_file), daemon=True).start()
+
+    @staticmethod
+    def _pump(stream, replies, log_file):
+        """
+        Reader thread: reply lines go to `replies` (then None at EOF), all other output to the worker log. A reply
+        that does not decode still answers its job, as an "error" status, so the caller is not left waiting.
+        """
+        for line in stream:
+            if line.startswith(FLEET_RESULT_PREFIX):
+                try:
+                    reply = json.loads(line[len(FLEET_RESULT_PREFIX):])
+                except ValueError:
+                    reply = None
+                if not isinstance(reply, dict):
+                    print_with_color(f"[ERROR] Malformed reply from the agent process: {line.strip()[:200]}", "red")
+                    reply = {"status": "error"}
+                replies.put(reply)
+            else:
+                log_file.write(line)
+                log_file.flush()
+        replies.put(None)
+
+    def run(self, request, timeout=None):
+        """
+        Sends one job to the process (starting it if needed) and waits for its reply.
+        Returns (reply, None), or (None, "timeout") / (None, "crashed"); the process is stopped in both error cases.
+        """
+        if self.proc is None or self.proc.poll() is not None:
+            self.stop()
+            self._start()
+        try:
+            self.proc.stdin.write(json.dumps(request) + "\n")
+            self.proc.stdin.flush()
+        except (BrokenPipeError, OSError):
+            self.stop()
+            return None, "crashed"
+        try:
+            reply = self._replies.get(timeout=timeout)
+        except queue.Empty:
+            self.stop(terminate=True)
+            return None, "timeout"
+        if reply is None:
+            self.stop()
+            return None, "crashed"
+        return reply, None
+
+    def stop(self, terminate=False):
+        """
+        Ends the process. Closing stdin lets it finish and close its session (restoring the device profile); with
+        `terminate` (a hung job) it gets SIGTERM, which ends the current task through the same cleanup. A process
+        still running after grace_period seconds is killed with its adb children, and the device settings it left
+        changed are restored from its profile file.
+        """
+        proc, self.proc = self.proc, None
+        if proc is not None:
+            try:
+                if terminate:
+                    proc.terminate()
+                else:
+                    proc.stdin.close()
+            except OSError:
+                pass
+            try:
+                proc.wait(timeout=self.grace_period)
+            except subprocess.TimeoutExpired:
+                print_with_color(f"[{self.serial}] [WARNING] Agent process did not exit within {self.grace_period}s; killing it.", "orange")
+                self._kill(proc)
+            if os.path.exists(self.profile_path):
+                self._restore_device_settings()
+        if self._log_file is not None:
+            self._log_file.close()
+            self._log_file = None
+
+    @staticmethod
+    def _kill(proc):
+        if os.name != "nt":
+            try:
+                os.killpg(proc.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        else:
+            proc.kill()
+        proc.wait()
+
+    def _restore_device_settings(self):
+        """Puts back the settings a crashed or killed agent process changed (its profile file) on this device."""
+        try:
+            with open(self.profile_path, "r", encoding="utf-8") as f:
+                saved_settings = json.load(f)
+            os.remove(self.profile_path)
+        except (OSError, ValueError) as e:
+            print_with_color(f"[{self.serial}] [WARNING] Could not read the agent's device profile {self.profile_path}: {e}", "orange")
+            return
+        if not saved_settings:
+            return
+        from scripts.and_controller import restore_saved_settings
+        print_with_color(f"[{self.serial}] Restoring the device settings left by the stopped agent process...", "yellow")
+        err = restore_saved_settings(self.serial, saved_settings)
+        if err:
+            print_with_color(f"[{self.serial}] [ERROR] Could not restore device settings: {err}", "red")
+
+def run_fleet_job(job, serial, installed_apks, agent_worker, log_dir, max_install_retries, install_wait_time, job_timeout):
+    """Installs (once per device) and runs one job on `serial` through the device's AgentWorkerProcess. Returns its result record."""
+    started = time.time()
+    result = {"job_id": job["id"], "apk": job["apk"], "task": job["task"], "model": job.get("model"),
+              "device": serial, "package": None, "status": None, "agent_status": None, "started": round(started, 3)}
+
+    def finish(status):
+        result["status"] = status
+        result["duration_s"] = round(time.time() - started, 3)
+        return result
+
+    try:
+        package_name, app_name_from_apk = get_apk_info(job["apk"])
+    except Exception as e:
+        print_with_color(f"[{serial}] [ERROR] Could not get APK info for {job['apk']}: {e}", "red")
+        return finish("apk_error")
+    if not package_name:
+        return finish("apk_error")
+    result["package"] = package_name
+
+    apk_key = os.path.abspath(job["apk"])
+    if apk_key not in installed_apks:
+        print_with_color(f"[{serial}] Installing {app_name_from_apk} ({package_name})...", "yellow")
+        if not install_and_verify(job["apk"], package_name, app_name_from_apk, serial, max_install_retries, install_wait_time):
+            return finish("install_failed")
+        installed_apks.add(apk_key)
+
+    log_path = os.path.join(log_dir, f"{job['id']}_{serial.replace(':', '_')}.log")
+    result["log"] = log_path
+    # The API key travels over the worker's stdin, never on a command line (visible to every user in ps)
+    request = {"id": job["id"], "app_name": agent_app_name(app_name_from_apk), "package_name": package_name,
+               "task": job["task"], "model": job.get("model"), "api_key": job.get("api_key"), "log": log_path}
+    print_with_color(f"[{serial}] Running job {job['id']}: {job['task']}", "blue")
+    reply, err = agent_worker.run(request, job_timeout)
+    if err == "timeout":
+        print_with_color(f"[{serial}] [WARNING] Job {job['id']} exceeded {job_timeout}s and its agent process was stopped.", "orange")
+        return finish("timeout")
+    if err:
+        print_with_color(f"[{serial}] [ERROR] Agent process exited during job {job['id']} (see {agent_worker.log_path}).", "red")
+        return finish("agent_failed")
+    result["agent_status"] = reply.get("status")
+    for key in ("rounds", "mode", "task_dir", "app_events"):
+        result[key] = reply.get(key)
+    ok = reply.get("status") not in ("launch_failed", "error", "model_error")
+    print_with_color(f"[{serial}] Job {job['id']} finished with status '{reply.get('status')}'.", "green" if ok else "orange")
+    return finish("ok" if ok else "agent_failed")
+
+def _fleet_worker(serial, job_queue, sink, agent_worker, log_dir, max_install_retries, install_wait_time, job_timeout):
+    installed_apks = set() # APKs already installed on this device during this fleet run
+    try:
+        while True:
+            try:
+                job = job_queue.get_nowait()
+            except queue.Empty:
+                return
+            result = run_fleet_job(job, serial, installed_apks, agent_worker, log_dir,
+                                   max_install_retries, install_wait_time, job_timeout)
+            if result["status"] != "ok" and run_adb_command("get-state", serial) != "device":
+                # The job may have failed because the device itself went away: hand it to another worker and retire this one
+                print_with_color(f"[{serial}] [ERROR] Device is no longer online; stopping its worker.", "red")
+                job_queue.put(job)
+                return
+            sink.write(result)
+    finally:
+        agent_worker.stop()
+
+def run_fleet(jobs_path, devices=None, results_path="fleet_results.jsonl", root_dir_for_agent=".",
+              max_install_retries=2, install_wait_time=5, job_timeout=None):
+    """
+    Runs every job of `jobs_path` (see load_fleet_jobs) across `devices` (default: all online devices), one worker
+    thread per device pulling from a shared queue, so faster devices take more jobs. Each device runs its jobs in
+    one long-lived agent process (see AgentWorkerProcess); results are appended to `results_path` as JSON lines.
+    Returns the list of jobs that could not be run because no device was left.
+    """
+    jobs = load_fleet_jobs(jobs_path)
+    devices = devices or attached_devices()
+    if not jobs:
+        print_with_color(f"[ERROR] No valid jobs in {jobs_path}.", "red")
+        return []
+    if not devices:
+        print_with_color("[ERROR] No online devices for the fleet.", "red")
+        return jobs
+
+    log_dir = os.path.join(os.path.abspath(root_dir_for_agent), "fleet_logs")
+    os.makedirs(log_dir, exist_ok=True)
+    job_queue = queue.Queue()
+    for job in jobs:
+        job_queue.put(job)
+    sink = ResultsSink(results_path)
+
+    print_with_color(f"--- Fleet: {len(jobs)} job(s) on {len(devices)} device(s): {', '.join(devices)} ---", "blue")
+    fleet_start = time.time()
+    agent_workers = {serial: AgentWorkerProcess(serial, root_dir_for_agent, log_dir) for serial in devices}
+    workers = [threading.Thread(target=_fleet_worker, name=f"fleet-{serial}", daemon=True,
+                                args=(serial, job_queue, sink, agent_workers[serial], log_dir,
+                                      max_install_retries, install_wait_time, job_timeout))
+               for serial in devices]
+    for worker in workers:
+        worker.start()
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        # Agent processes run in their own session and do not see Ctrl+C: stop them so they restore their devices
+        print_with_color("Interrupted; stopping the agent processes...", "orange")
+        for agent_worker in agent_workers.values():
+            agent_worker.stop(terminate=True)
+        raise
+
+    not_run = []
+    while not job_queue.empty():
+        job = job_queue.get_nowait()
+        not_run.append(job)
+        sink.write({"job_id": job["id"], "apk": job["apk"], "task": job["task"], "model": job.get("model"),
+                    "device": None, "status": "not_run"})
+    print_with_color(f"--- Fleet finished in {time.time() - fleet_start:.1f}s; results in {results_path} ---", "blue")
+    if not_run:
+        print_with_color(f"[WARNING] {len(not_run)} job(s) were not run: every device went offline.", "orange")
+    return not_run
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Install an APK, run the agent, and manage the workflow.")
-    parser.add_argument("apk_path", help="Path to the .apk file.")
-    parser.add_argument("task_description", help="The task or description for the agent.")
+    parser.add_argument("apk_path", nargs="?", help="Path to the .apk file.")
+    parser.add_argument("task_description", nargs="?", help="The task or description for the agent.")
     parser.add_argument("--agent_root_dir", default=".", help="Root directory for the agent's operations. Default: current directory.")
     # New arguments for model and API key to pass to the agent
     parser.add_argument("--agent_model_choice", type=str, default=None, choices=["OpenAI", "Qwen", "Gemini"],
@@ -148,11 +456,29 @@ if __name__ == "__main__":
     parser.add_argument("--agent_api_key", type=str, default=None,
                         help="Override API key for the agent's chosen VLM. Use with --agent_model_choice.")
     
+    parser.add_argument("--device", type=str, default=None, help="Device serial for a single-APK run. Default: the only online device.")
     parser.add_argument("--retries", type=int, default=2, help="Maximum installation retries.")
     parser.add_argument("--wait", type=int, default=5, help="Wait time in seconds after installation attempt.")
 
+    # Fleet mode
+    parser.add_argument("--jobs", type=str, default=None,
+                        help="JSONL file of jobs ({\"apk\": ..., \"task\": ..., \"model\": ...} per line). Runs them in parallel across devices instead of apk_path/task_description.")
+    parser.add_argument("--devices", type=str, default=None,
+                        help="Comma-separated device serials for fleet mode. Default: every online device.")
+    parser.add_argument("--results", type=str, default="fleet_results.jsonl", help="JSONL file that fleet results are appended to.")
+    parser.add_argument("--job_timeout", type=float, default=None, help="Seconds after which a fleet job's agent is stopped.")
+
     args_workflow = parser.parse_args()
 
+    if args_workflow.jobs:
+        fleet_devices = [serial.strip() for serial in args_workflow.devices.split(",") if serial.strip()] if args_workflow.devices else None
+        not_run = run_fleet(args_workflow.jobs, fleet_devices, args_workflow.results, args_workflow.agent_root_dir,
+                            args_workflow.retries, args_workflow.wait, args_workflow.job_timeout)
+        sys.exit(1 if not_run else 0)
+
+    if not args_workflow.apk_path or not args_workflow.task_description:
+        parser.error("apk_path and task_description are required unless --jobs is given.")
+
     if not os.path.isfile(args_workflow.apk_path):
         print_with_color(f"Error: Provided APK path is not a file or does not exist: {args_workflow.apk_path}", "red")
         sys.exit(1)
@@ -166,4 +492,5 @@ if __name__ == "__main__":
                   args_workflow.agent_model_choice, # Pass to main_workflow
                   args_workflow.agent_api_key,      # Pass to main_workflow
                   args_workflow.retries, 
-                  args_workflow.wait)
\ No newline at end of file
+                  args_workflow.wait,
+                  args_workflow.device)
\ No newline at end of file